@@ -2,41 +2,112 @@
 
 __all__ = ["index", "modules", "custom_doc_links", "git_url"]
 
-index = {"nb2md": "convert.ipynb",
+index = {"default_asset_dir": "assets.ipynb",
+         "asset_name": "assets.ipynb",
+         "save_asset_chunks": "assets.ipynb",
+         "save_asset": "assets.ipynb",
+         "asset_refs": "assets.ipynb",
+         "gc_assets": "assets.ipynb",
+         "synthetic_nb": "benchmark.ipynb",
+         "write_cases": "benchmark.ipynb",
+         "bench_cases": "benchmark.ipynb",
+         "bench_nb2md": "benchmark.ipynb",
+         "bench_preprocessors": "benchmark.ipynb",
+         "bench_truncate": "benchmark.ipynb",
+         "bench_docindex": "benchmark.ipynb",
+         "bench_showdoc": "benchmark.ipynb",
+         "run_benchmarks": "benchmark.ipynb",
+         "save_results": "benchmark.ipynb",
+         "load_results": "benchmark.ipynb",
+         "compare_results": "benchmark.ipynb",
+         "nbdoc_bench": "benchmark.ipynb",
+         "file_hash": "cache.ipynb",
+         "exporter_fingerprint": "cache.ipynb",
+         "default_cache_dir": "cache.ipynb",
+         "BuildCache": "cache.ipynb",
+         "FormatCache": "cache.ipynb",
+         "run_deps": "cache.ipynb",
+         "RunCache": "cache.ipynb",
+         "nb2md": "convert.ipynb",
+         "timing_report": "convert.ipynb",
          "parallel_nb2md": "convert.ipynb",
+         "watch_nb2md": "convert.ipynb",
          "nbdoc_build": "convert.ipynb",
+         "default_socket": "daemon.ipynb",
+         "daemon_request": "daemon.ipynb",
+         "NbdocServer": "daemon.ipynb",
+         "nbdoc_serve": "daemon.ipynb",
          "mdglob": "docindex.ipynb",
+         "index_md": "docindex.ipynb",
          "build_index": "docindex.ipynb",
          "get_idx": "docindex.ipynb",
          "NbdevLookup": "docindex.ipynb",
          "nbdoc_linkify": "docindex.ipynb",
+         "atomic_write": "fileio.ipynb",
+         "write_if_changed": "fileio.ipynb",
+         "write_chunks": "fileio.ipynb",
+         "read_nb": "fileio.ipynb",
          "InjectMeta": "mdx.ipynb",
          "StripAnsi": "mdx.ipynb",
          "InsertWarning": "mdx.ipynb",
          "RmEmptyCode": "mdx.ipynb",
          "MetaflowTruncate": "mdx.ipynb",
          "UpdateTags": "mdx.ipynb",
+         "LineFilter": "mdx.ipynb",
+         "line_filter": "mdx.ipynb",
          "MetaflowSelectSteps": "mdx.ipynb",
          "FilterOutput": "mdx.ipynb",
+         "budget_text": "mdx.ipynb",
+         "OutputBudget": "mdx.ipynb",
+         "SelectedOutputBudget": "mdx.ipynb",
          "Limit": "mdx.ipynb",
          "HideInputLines": "mdx.ipynb",
          "WriteTitle": "mdx.ipynb",
          "CleanFlags": "mdx.ipynb",
          "CleanMagics": "mdx.ipynb",
          "Black": "mdx.ipynb",
-         "black_mode": "mdx.ipynb",
+         "black_cache": "mdx.ipynb",
+         "__getattr__": "mdx.ipynb",
          "CatFiles": "mdx.ipynb",
          "BashIdentify": "mdx.ipynb",
          "CleanShowDoc": "mdx.ipynb",
+         "FusedPreprocessor": "mdx.ipynb",
+         "fuse_preprocessors": "mdx.ipynb",
+         "named_preprocessors": "mdx.ipynb",
+         "time_preprocessors": "mdx.ipynb",
+         "MdxExporter": "mdx.ipynb",
          "get_mdx_exporter": "mdx.ipynb",
          "HTMLdf": "media.ipynb",
+         "is_dataframe": "media.ipynb",
          "HTMLEscape": "media.ipynb",
+         "b64_chunks": "media.ipynb",
          "ImageSave": "media.ipynb",
          "ImagePath": "media.ipynb",
+         "NbResult": "report.ipynb",
+         "summary": "report.ipynb",
+         "results_json": "report.ipynb",
+         "results_junit": "report.ipynb",
+         "write_reports": "report.ipynb",
+         "KernelPool": "run.ipynb",
+         "kernel_pool": "run.ipynb",
          "nbrun": "run.ipynb",
          "nbupdate": "run.ipynb",
+         "async_nbrun": "run.ipynb",
+         "async_nbupdate": "run.ipynb",
+         "async_parallel_nbupdate": "run.ipynb",
          "parallel_nbupdate": "run.ipynb",
          "nbdoc_update": "run.ipynb",
+         "parse_shard": "shard.ipynb",
+         "Durations": "shard.ipynb",
+         "estimate_durations": "shard.ipynb",
+         "partition": "shard.ipynb",
+         "shard_files": "shard.ipynb",
+         "makespan": "shard.ipynb",
+         "schedule": "shard.ipynb",
+         "build_outputs": "shard.ipynb",
+         "save_shard": "shard.ipynb",
+         "merge_shards": "shard.ipynb",
+         "nbdoc_merge": "shard.ipynb",
          "is_valid_xml": "showdoc.ipynb",
          "param2JSX": "showdoc.ipynb",
          "np2jsx": "showdoc.ipynb",
@@ -46,15 +117,32 @@ index = {"nb2md": "convert.ipynb",
          "get_base_urls": "showdoc.ipynb",
          "ShowDoc": "showdoc.ipynb",
          "run_preprocessor": "test_utils.ipynb",
-         "show_plain_md": "test_utils.ipynb"}
+         "show_plain_md": "test_utils.ipynb",
+         "startup_time": "test_utils.ipynb",
+         "heavy_imports": "test_utils.ipynb",
+         "nbglob": "watch.ipynb",
+         "InotifyWatcher": "watch.ipynb",
+         "PollWatcher": "watch.ipynb",
+         "watch_nbs": "watch.ipynb",
+         "rss_mb": "workers.ipynb",
+         "recycling_map": "workers.ipynb"}
 
-modules = ["convert.py",
+modules = ["assets.py",
+           "benchmark.py",
+           "cache.py",
+           "convert.py",
+           "daemon.py",
            "docindex.py",
+           "fileio.py",
            "mdx.py",
            "media.py",
+           "report.py",
            "run.py",
+           "shard.py",
            "showdoc.py",
-           "test_utils.py"]
+           "test_utils.py",
+           "watch.py",
+           "workers.py"]
 
 doc_url = "https://outerbounds.github.io/nbdoc/"
 
@@ -0,0 +1,48 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/assets.ipynb (unless otherwise specified).
+
+__all__ = ['default_asset_dir', 'asset_name', 'save_asset_chunks', 'save_asset', 'asset_refs', 'gc_assets']
+
+# Cell
+import hashlib, re
+from nbdev.imports import get_config
+from fastcore.xtras import Path
+from .fileio import write_chunks
+
+# Cell
+def default_asset_dir():
+    "The asset store set by `asset_dir` in settings.ini, or None if images are saved next to each notebook."
+    cfg = get_config()
+    return cfg.config_path/cfg['asset_dir'] if cfg.get('asset_dir') else None
+
+def asset_name(fname, data):
+    "The name of `data`, an output that was extracted to `fname`, in the asset store."
+    if isinstance(data, str): data = data.encode()
+    return hashlib.sha256(data).hexdigest()[:20] + Path(fname).suffix
+
+def save_asset_chunks(store, fname, chunks):
+    "Save the bytes in `chunks`, an output that was extracted to `fname`, in the asset `store` unless it is already there, and return its path and sha256 hex digest."
+    Path(store).mkdir(parents=True, exist_ok=True)
+    return write_chunks(store, chunks, name=lambda digest: digest[:20] + Path(fname).suffix)
+
+def save_asset(store, fname, data):
+    "Save `data`, an output that was extracted to `fname`, in the asset `store` unless it is already there, and return its path."
+    return save_asset_chunks(store, fname, [data.encode() if isinstance(data, str) else data])[0]
+
+# Cell
+_re_asset = re.compile(r'\b[0-9a-f]{20}\.\w+')
+
+def asset_refs(md, store=None):
+    "The files in the asset `store` that the markdown file `md` refers to."
+    store,md = store or default_asset_dir(),Path(md)
+    if store is None or not md.exists(): return []
+    return sorted({Path(store)/n for n in _re_asset.findall(md.read_text()) if (Path(store)/n).is_file()})
+
+def gc_assets(store=None, path=None):
+    "Remove the assets in `store` that no markdown file in `path`, which defaults to `nbs_path`, refers to, and return them.  Other files in `store` are kept."
+    store = Path(store) if store else default_asset_dir()
+    if store is None or not store.is_dir(): return []
+    path = Path(path) if path else get_config().path('nbs_path')
+    used = {n for md in path.rglob('*.md') for n in _re_asset.findall(md.read_text())}
+    unused = [f for f in sorted(store.iterdir()) if f.is_file() and _re_asset.fullmatch(f.name) and f.name not in used] # only files named after their content
+    for f in unused: f.unlink(missing_ok=True)
+    return unused
\ No newline at end of file
@@ -0,0 +1,333 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/benchmark.ipynb (unless otherwise specified).
+
+__all__ = ['synthetic_nb', 'write_cases', 'bench_cases', 'bench_nb2md', 'bench_preprocessors', 'bench_truncate',
+           'bench_docindex', 'bench_showdoc', 'run_benchmarks', 'save_results', 'load_results', 'compare_results',
+           'nbdoc_bench']
+
+# Cell
+import json, random, shutil, subprocess, sys, tempfile, time, base64, platform, tracemalloc
+from copy import deepcopy
+from statistics import median
+from contextlib import contextmanager
+import nbformat
+from nbformat.v4 import new_notebook, new_code_cell, new_markdown_cell, new_output
+from nbdev.imports import get_config
+from fastcore.all import Path, call_parse, Param, store_true
+from nbdoc import __version__
+from .cache import default_cache_dir
+from .mdx import get_mdx_exporter, named_preprocessors, MetaflowTruncate
+from .convert import nb2md
+from .docindex import build_index, NbdevLookup
+from .showdoc import ShowDoc
+
+# Cell
+_words = 'flow step run data card artifact parameter foreach join branch'.split()
+
+def _ansi(color, s): return f'\x1b[{color}m{s}\x1b[0m'
+
+def _stdout_lines(rng, n):
+    "`n` lines of log output, some of them with warnings and colors."
+    for i in range(n):
+        if i % 50 == 0: yield _ansi(33, f'FutureWarning: {rng.choice(_words)} is deprecated')
+        else: yield f'{i} ' + ' '.join(rng.choices(_words, k=8))
+
+def _html_table(rng, rows, cols=8):
+    "A table like the ones pandas renders for a `DataFrame`."
+    head = ''.join(f'<th>col_{j}</th>' for j in range(cols))
+    body = ''.join(f'<tr><th>{i}</th>' + ''.join(f'<td>{rng.random():.4f}</td>' for _ in range(cols)) + '</tr>\n'
+                   for i in range(rows))
+    return ('<div>\n<style scoped>\n    .dataframe tbody tr th:only-of-type {\n        vertical-align: middle;\n    }\n'
+            '    .dataframe thead th {\n        text-align: right;\n    }\n</style>\n'
+            f'<table border="1" class="dataframe">\n<thead><tr><th></th>{head}</tr></thead>\n<tbody>\n{body}</tbody>\n</table>\n</div>')
+
+def _flow_log(rng, steps, lines_per_step=20):
+    "The output of `python flow.py run` for a linear flow with `steps` steps."
+    ts = lambda: _ansi(35, f'2022-03-14 17:{rng.randrange(60):02d}:{rng.randrange(60):02d}.{rng.randrange(1000):03d} ')
+    out = [_ansi(35, 'Metaflow 2.5.3 executing MyFlow for user:hamel'), _ansi(35, 'Validating your flow...'),
+           _ansi(32, '    The graph looks good!'), _ansi(35, 'Running pylint...'), _ansi(32, '    Pylint is happy!'),
+           ts() + 'Workflow starting (run-id 1647304124981100):']
+    names = ['start'] + [f'step_{i}' for i in range(1, steps-1)] + ['end']
+    for i,name in enumerate(names[:steps]):
+        task = _ansi(32, f'[1647304124981100/{name}/{i+1} (pid {41951+i})] ')
+        out.append(ts() + task + 'Task is starting.')
+        out += [ts() + task + ' '.join(rng.choices(_words, k=6)) for _ in range(lines_per_step)]
+        out.append(ts() + task + 'Task finished successfully.')
+    return '\n'.join(out + [ts() + 'Done!']) + '\n'
+
+def _png(rng, kb):
+    "A base64 encoded PNG signature followed by `kb` KiB of random bytes, which is never decoded as an image."
+    return base64.b64encode(b'\x89PNG\r\n\x1a\n' + rng.getrandbits(kb*8192).to_bytes(kb*1024, 'little')).decode()
+
+# Cell
+def synthetic_nb(cells=20, stdout_lines=0, images=0, image_kb=100, table_rows=0, flow_steps=0, seed=0):
+    "A notebook with `cells` markdown and code cells, followed by cells with the outputs that are requested."
+    rng = random.Random(seed)
+    nb = new_notebook(metadata={'kernelspec': {'display_name': 'Python 3', 'language': 'python', 'name': 'python3'}})
+    for i in range(cells):
+        if i % 2 == 0: nb.cells.append(new_markdown_cell(f'## Section {i}\n\nUse `{rng.choice(_words)}_{i}` with `nb2md`.'))
+        else:
+            src = f'#meta:tag=hide_output\nx_{i} = {i}' if i % 10 == 1 else f'print(x_{i-2} if {i} > 2 else {i})'
+            nb.cells.append(new_code_cell(src, outputs=[new_output('stream', name='stdout', text=f'{i}\n')]))
+    if stdout_lines:
+        text = '\n'.join(_stdout_lines(rng, stdout_lines)) + '\n'
+        for src in ('train()', '#meta:filter_words=FutureWarning\ntrain()'):
+            nb.cells.append(new_code_cell(src, outputs=[new_output('stream', name='stdout', text=text)]))
+    for i in range(images):
+        data = {'image/png': _png(rng, image_kb), 'text/plain': '<Figure size 432x288 with 1 Axes>'}
+        nb.cells.append(new_code_cell(f'plot({i})', outputs=[new_output('display_data', data=data)]))
+    if table_rows:
+        data = {'text/html': _html_table(rng, table_rows), 'text/plain': f'[{table_rows} rows x 8 columns]'}
+        nb.cells.append(new_code_cell('df', outputs=[new_output('execute_result', data=data, execution_count=1)]))
+    if flow_steps:
+        log = _flow_log(rng, flow_steps)
+        for src in ('!python myflow.py run', '#meta:show_steps=start,end\n!python myflow.py run'):
+            nb.cells.append(new_code_cell(src, outputs=[new_output('stream', name='stdout', text=log)]))
+    for i,c in enumerate(nb.cells): c.id = f'cell-{i}' # the same notebook for the same arguments
+    return nb
+
+# Cell
+bench_cases = {
+    'many_cells':    dict(cells=2000),
+    'huge_stdout':   dict(cells=10, stdout_lines=100_000),
+    'big_images':    dict(cells=10, images=20, image_kb=500),
+    'big_tables':    dict(cells=10, table_rows=10_000),
+    'metaflow_logs': dict(cells=10, flow_steps=50),
+}
+
+def write_cases(dest, quick=False):
+    "Write a notebook for each of `bench_cases` to `dest`."
+    dest = Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    files = []
+    for name,kw in bench_cases.items():
+        if quick: kw = {k:max(1, v//50) for k,v in kw.items()}
+        nbformat.write(synthetic_nb(**kw), dest/f'{name}.ipynb')
+        files.append(dest/f'{name}.ipynb')
+    return files
+
+# Cell
+def _timeit(f, repeat=3, setup=None):
+    "The best and median wall time of calling `f(setup())` `repeat` times, in seconds."
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        f(arg) if setup else f()
+        times.append(time.perf_counter()-start)
+    return {'best': min(times), 'median': median(times)}
+
+def _peak_mb(f):
+    "The peak memory allocated by Python while calling `f`, in MB."
+    tracemalloc.start()
+    try:
+        f()
+        return tracemalloc.get_traced_memory()[1]/2**20
+    finally: tracemalloc.stop()
+
+# Cell
+def bench_nb2md(files, repeat=3):
+    "Time `nb2md` on each notebook in `files`, and with strict validation (`/validate`), and measure its peak memory."
+    res = {}
+    for validate in (False, True):
+        exp = get_mdx_exporter(validate=validate)
+        exp.template # compile the template before timing
+        sfx = '/validate' if validate else ''
+        res.update({f'nb2md/{Path(f).stem}{sfx}': {**_timeit(lambda: nb2md(f, exp), repeat), 'peak_mb': _peak_mb(lambda: nb2md(f, exp))}
+                    for f in files})
+    return res
+
+# Cell
+class _Record:
+    "Call preprocessor `pp` and record a copy of its input in `inputs[name]`."
+    def __init__(self, pp, name, inputs): self.pp,self.name,self.inputs = pp,name,inputs
+
+    def __call__(self, nb, resources):
+        self.inputs[self.name] = (self.pp, deepcopy(nb), deepcopy(resources))
+        return self.pp(nb, resources)
+
+def _preprocessor_inputs(fname):
+    "The input of each preprocessor of the MDX exporter when converting `fname`."
+    exp, inputs = get_mdx_exporter(fuse=False), {}
+    rec = {id(p):_Record(p, name, inputs) for p,name in named_preprocessors(exp)}
+    exp._preprocessors = [rec.get(id(p), p) for p in exp._preprocessors]
+    exp.from_filename(str(fname))
+    return inputs
+
+def bench_preprocessors(files, repeat=3):
+    "Time each preprocessor of the MDX exporter on each notebook in `files`."
+    res = {}
+    for f in files:
+        for name,(pp,nb,resources) in _preprocessor_inputs(f).items():
+            res[f'preprocessor/{Path(f).stem}/{name}'] = _timeit(lambda o: pp(*o), repeat,
+                                                                 setup=lambda: (deepcopy(nb), deepcopy(resources)))
+    return res
+
+# Cell
+def _metaflow_log(mb, missing=None, seed=0):
+    "The output of running a flow that is about `mb` MB, without `missing`."
+    rng = random.Random(seed)
+    step = len(_flow_log(rng, 10))/10
+    log = _flow_log(rng, max(2, round(mb*2**20/step)))
+    return log.replace(missing, '') if missing else log
+
+_truncate_cases = {'complete': None, 'no_metaflow': 'Metaflow', 'no_graph': 'The graph', 'no_workflow': 'Workflow starting'}
+
+def bench_truncate(mb=10, repeat=3):
+    "Time `MetaflowTruncate` on logs of `mb/4`, `mb/2` and `mb` MB, which have every marker or miss one of them."
+    pp, res = MetaflowTruncate(), {}
+    for case,missing in _truncate_cases.items():
+        for size in (mb/4, mb/2, mb):
+            cell = new_code_cell('!python myflow.py run', outputs=[new_output('stream', name='stdout', text=_metaflow_log(size, missing))])
+            res[f'truncate/{case}/{size:g}MB'] = _timeit(lambda c: pp.preprocess_cell(c, {}, 0), repeat, setup=lambda: deepcopy(cell))
+    return res
+
+# Cell
+@contextmanager
+def _preserve(fname):
+    "Restore the content of `fname` on exit, or remove it if it didn't exist."
+    fname = Path(fname)
+    old = fname.read_bytes() if fname.exists() else None
+    try: yield
+    finally:
+        if old is None: fname.unlink(missing_ok=True)
+        else: fname.write_bytes(old)
+
+def _write_docs(dest, pages, names):
+    "Write `pages` markdown files to `dest` with `names` `DocSection`s each."
+    dest = Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    for i in range(pages):
+        secs = '\n'.join(f'<DocSection type="function" name="fn_{i}_{j}" module="mod_{i}">\n</DocSection>' for j in range(names))
+        (dest/f'page_{i}.md').write_text(f'---\nslug: /api/page_{i}\n---\n\n# Page {i}\n\n{secs}\n')
+
+def _backticked_md(rng, n, pages, names):
+    "Markdown with `n` lines that mention documented and unknown names in backticks, and some code fences."
+    lines = []
+    for i in range(n):
+        if i % 20 == 0: lines += ['```python', f'fn_0_0(x_{i})', '```']
+        else: lines.append(f'Call `fn_{rng.randrange(pages)}_{rng.randrange(names)}` or `{rng.choice(_words)}` on the `df`.')
+    return '\n'.join(lines)
+
+def bench_docindex(dest, repeat=3, pages=1000, names=20):
+    "Time `build_index` and `NbdevLookup.linkify` on a synthetic site in `dest`."
+    _write_docs(dest, pages, names)
+    with _preserve(get_config().config_path/'_nbdoc_index.json'):
+        res = {'build_index': _timeit(lambda: build_index(dest), repeat)}
+        lookup = NbdevLookup(md_path=dest)
+        lookup.syms = build_index(dest)
+    md = _backticked_md(random.Random(0), 50*pages, pages, names)
+    res['linkify'] = _timeit(lambda: lookup.linkify(md), repeat)
+    return res
+
+# Cell
+def _numpydoc_example(a:int, b:str='b', *args, c:float=1.0, **kwargs) -> dict:
+    """
+    A function with every section that `ShowDoc` renders.
+
+    This is a longer description that spans
+    more than one line.
+
+    Parameters
+    ----------
+    a : int
+        The first parameter.
+    b : str, optional
+        The second parameter.
+    c : float
+        A keyword only parameter.
+
+    Returns
+    -------
+    dict
+        The result.
+
+    Raises
+    ------
+    ValueError
+        If `a` is negative.
+    """
+    return {}
+
+def bench_showdoc(repeat=3):
+    "Time rendering `ShowDoc` for a few objects."
+    objs = {'function': nb2md, 'class': NbdevLookup, 'method': NbdevLookup.linkify, 'numpydoc': _numpydoc_example}
+    def render(o):
+        doc = ShowDoc(o)
+        return doc.jsx, doc._repr_html_()
+    return {f'showdoc/{k}': _timeit(lambda: render(o), repeat) for k,o in objs.items()}
+
+# Cell
+def _git_commit():
+    "The short hash of HEAD, suffixed with `-dirty` if tracked files were changed, or None outside of git."
+    try:
+        run = lambda *a: subprocess.run(['git', *a], check=True, capture_output=True, text=True).stdout.strip()
+        return run('rev-parse', '--short', 'HEAD') + ('-dirty' if run('status', '--porcelain', '--untracked-files=no') else '')
+    except (OSError, subprocess.CalledProcessError): return None
+
+def run_benchmarks(repeat=3, quick=False, only=None):
+    "Run the benchmarks whose name contains `only` on `bench_cases`."
+    tmp = Path(tempfile.mkdtemp(prefix='nbdoc_bench_'))
+    try:
+        files = write_cases(tmp/'nbs', quick=quick)
+        pages, names = (10, 5) if quick else (1000, 20)
+        fams = {'nb2md': lambda: bench_nb2md(files, repeat),
+                'preprocessor': lambda: bench_preprocessors(files, repeat),
+                'build_index linkify': lambda: bench_docindex(tmp/'docs', repeat, pages, names),
+                'showdoc': lambda: bench_showdoc(repeat),
+                'truncate': lambda: bench_truncate(0.1 if quick else 10, repeat)}
+        run = [f for k,f in fams.items() if not only or any(only in w for w in k.split())]
+        if not run: # `only` is the name of a case or a preprocessor
+            files = [f for f in files if only in f.stem] or files
+            run = [fams['nb2md'], fams['preprocessor']]
+        res = {}
+        for f in run: res.update(f())
+    finally: shutil.rmtree(tmp, ignore_errors=True)
+    if only: res = {k:v for k,v in res.items() if only in k}
+    return {'commit': _git_commit(), 'version': __version__, 'python': platform.python_version(),
+            'machine': platform.platform(), 'quick': quick, 'repeat': repeat, 'results': res}
+
+# Cell
+def save_results(res, results_dir=None):
+    "Save `res` in `results_dir` as `<commit>.json`, and return its path."
+    results_dir = Path(results_dir) if results_dir else default_cache_dir()/'bench'
+    results_dir.mkdir(parents=True, exist_ok=True)
+    fname = results_dir/f"{res['commit'] or 'nocommit'}.json"
+    fname.write_text(json.dumps(res, indent=2))
+    return fname
+
+def load_results(ref, results_dir=None):
+    "Load the results saved by `save_results` for commit `ref`, which can also be the name of a JSON file."
+    results_dir = Path(results_dir) if results_dir else default_cache_dir()/'bench'
+    fname = Path(ref) if Path(ref).is_file() else results_dir/f'{ref}.json'
+    return json.loads(fname.read_text())
+
+def compare_results(old, new, threshold=0.1):
+    "Print the ratio of the best times and peak memory in `new` to those in `old`, for the benchmarks in both."
+    print(f"{'benchmark':60} {old['commit'] or '':>12} {new['commit'] or '':>12}  ratio")
+    for k in sorted(set(old['results']) & set(new['results'])):
+        for m,worse,better in (('best', 'slower', 'faster'), ('peak_mb', 'more memory', 'less memory')):
+            if m not in old['results'][k] or m not in new['results'][k]: continue
+            a,b = old['results'][k][m], new['results'][k][m]
+            ratio = b/a if a else float('inf')
+            flag = f' {worse}' if ratio > 1+threshold else f' {better}' if ratio < 1-threshold else ''
+            name = k if m == 'best' else f'{k} {m}'
+            print(f'{name:60} {a:12.4f} {b:12.4f} {ratio:6.2f}{flag}')
+
+# Cell
+@call_parse
+def nbdoc_bench(
+    quick:store_true=False,  # Run on small notebooks, to check that the benchmarks work
+    repeat:int=3,  # Number of times each benchmark is run
+    only:str=None,  # Only run benchmarks whose name contains this string, for example `nb2md` or `big_tables`
+    compare:str=None,  # Compare with the results of this commit, or a JSON file with results
+    results_dir:str=None,  # Directory to save results in, defaults to `bench` in the build cache
+    no_save:store_true=False  # Don't save the results
+):
+    "Benchmark converting synthetic notebooks, indexing and linkifying docs and `ShowDoc`."
+    old = load_results(compare, results_dir) if compare else None # before the results of this commit are saved
+    res = run_benchmarks(repeat=repeat, quick=quick, only=only)
+    for k,v in res['results'].items():
+        peak = f" {v['peak_mb']:8.1f} MB" if 'peak_mb' in v else ''
+        print(f"{k:60} {v['best']:10.4f} {v['median']:10.4f}{peak}")
+    if not no_save: print(f'saved results to {save_results(res, results_dir)}')
+    if old: compare_results(old, res)
\ No newline at end of file
@@ -0,0 +1,215 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/cache.ipynb (unless otherwise specified).
+
+__all__ = ['file_hash', 'exporter_fingerprint', 'default_cache_dir', 'BuildCache', 'FormatCache', 'run_deps',
+           'RunCache']
+
+# Cell
+import hashlib, json, os, re, shutil, tempfile
+from functools import lru_cache
+from nbdev.imports import get_config
+from fastcore.xtras import Path
+from .fileio import write_if_changed, atomic_write
+from .assets import default_asset_dir, asset_refs
+from nbdoc import __version__
+
+# Cell
+def file_hash(fname):
+    "Return the sha256 hex digest of the bytes in `fname`."
+    h = hashlib.sha256()
+    with open(fname, 'rb') as f:
+        for chunk in iter(lambda: f.read(1<<20), b''): h.update(chunk)
+    return h.hexdigest()
+
+# Cell
+def _jsonable(o):
+    "Serialize classes by their import path, everything else by `repr`."
+    if isinstance(o, type): return f'{o.__module__}.{o.__qualname__}'
+    return repr(o)
+
+@lru_cache(maxsize=None)
+def _black_version():
+    from importlib.metadata import version
+    return version('black')
+
+def exporter_fingerprint(exp):
+    "Hash of the configuration of `exp`, its template, the `tst_flags` in settings.ini and the installed versions of nbdoc and black."
+    cfg = json.loads(json.dumps(exp.config, default=_jsonable))
+    for v in cfg.values():
+        if isinstance(v, dict): v.pop('template_file', None); v.pop('cache_dir', None) # absolute paths differ between machines
+    h = hashlib.sha256(f"{__version__}\0{_black_version()}\0{get_config().get('tst_flags', '')}".encode()) # `CleanFlags` reads tst_flags
+    h.update(json.dumps(cfg, sort_keys=True).encode())
+    tmp_file = Path(exp.template_file or '')
+    if tmp_file.is_file(): h.update(tmp_file.read_bytes())
+    return h.hexdigest()
+
+# Cell
+def default_cache_dir():
+    "The directory set by `cache_dir` in settings.ini, which defaults to `.nbdoc_cache` next to settings.ini."
+    cfg = get_config()
+    return cfg.config_path/cfg.get('cache_dir', '.nbdoc_cache')
+
+def _rel(fname):
+    "The path of `fname` relative to the directory of settings.ini."
+    f = Path(fname).resolve()
+    try: return f.relative_to(get_config().config_path.resolve()).as_posix()
+    except ValueError: return str(f)
+
+def _outputs(fname):
+    "The markdown file and asset directory that are generated for notebook `fname`."
+    fname = Path(fname)
+    return fname.with_suffix('.md'), fname.parent/f'_{fname.stem}_files'
+
+def _manifest(md, assets, refs=()):
+    "Hashes of the markdown file `md` and of every file in `assets`, and the names of the files in the asset store it refers to."
+    files = {}
+    if assets.is_dir():
+        files = {str(f.relative_to(assets)): file_hash(f) for f in sorted(assets.rglob('*')) if f.is_file()}
+    return {'md': file_hash(md), 'files': files, 'store': [f.name for f in refs]}
+
+# Cell
+class BuildCache:
+    "An on-disk cache of converted markdown and assets, keyed by notebook content and an exporter `fingerprint`."
+    def __init__(self, path=None, fingerprint='', asset_dir=None):
+        self.path = Path(path) if path else default_cache_dir()
+        self.fingerprint = fingerprint
+        self.asset_dir = Path(asset_dir) if asset_dir else default_asset_dir() # see `nbdoc.assets`
+
+    def key(self, fname):
+        "The cache key of notebook `fname`, which includes its path because the markdown links to `_<name>_files`."
+        return hashlib.sha256(f'{self.fingerprint}\0{_rel(fname)}\0{file_hash(fname)}'.encode()).hexdigest()
+
+    def _entry(self, key): return self.path/'build'/key[:2]/key
+
+    def is_current(self, fname, key):
+        "Whether the markdown and assets next to `fname` are exactly the ones cached under `key`."
+        man, (md, assets) = self._entry(key)/'manifest.json', _outputs(fname)
+        if not man.exists() or not md.exists(): return False
+        cached = json.loads(man.read_text())
+        if file_hash(md) != cached['md']: return False
+        if not all(self.asset_dir and (self.asset_dir/n).is_file() for n in cached.get('store', [])): return False
+        return all((assets/f).is_file() and file_hash(assets/f) == h for f,h in cached['files'].items())
+
+    def restore(self, fname, key):
+        "Copy the markdown and assets cached under `key` next to `fname`, returns `False` on a cache miss."
+        entry, (md, assets) = self._entry(key), _outputs(fname)
+        if not (entry/'manifest.json').exists(): return False
+        write_if_changed(md, (entry/'out.md').read_bytes())
+        for f in sorted((entry/'files').rglob('*')):
+            if not f.is_file(): continue
+            dest = assets/f.relative_to(entry/'files')
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            write_if_changed(dest, f.read_bytes()) # only assets that changed are touched
+        for f in sorted((entry/'store').glob('*')):
+            if not (self.asset_dir/f.name).exists(): # assets are named after their content
+                self.asset_dir.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(f, self.asset_dir/f.name)
+        return True
+
+    def store(self, fname, key):
+        "Cache the markdown and assets that were generated for `fname` under `key`."
+        entry, (md, assets) = self._entry(key), _outputs(fname)
+        if not md.exists(): return
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=f'.{entry.name}.', suffix='.tmp', dir=entry.parent)) # unique per process and thread
+        shutil.copyfile(md, tmp/'out.md')
+        if assets.is_dir(): shutil.copytree(assets, tmp/'files')
+        refs = asset_refs(md, self.asset_dir) if self.asset_dir else []
+        if refs: (tmp/'store').mkdir()
+        for f in refs: shutil.copyfile(f, tmp/'store'/f.name)
+        (tmp/'manifest.json').write_text(json.dumps(_manifest(md, assets, refs)))
+        os.chmod(tmp, 0o755) # `mkdtemp` only lets the owner read the directory
+        shutil.rmtree(entry, ignore_errors=True)
+        try: tmp.rename(entry)
+        except OSError: shutil.rmtree(tmp, ignore_errors=True) # another process cached the same notebook
+
+# Cell
+class FormatCache:
+    "An on-disk cache of formatted code, keyed by the code and the settings of the formatter, which keeps the most recently used entries within `max_bytes`."
+    def __init__(self, path=None, max_bytes=32*2**20):
+        self.path = Path(path) if path else default_cache_dir()/'format'
+        self.max_bytes,self._written = max_bytes,0
+
+    def key(self, src, settings=''):
+        "The cache key of code `src` formatted with `settings`."
+        return hashlib.sha256(f'{settings}\0{src}'.encode()).hexdigest()
+
+    def _entry(self, key): return self.path/key[:2]/key
+
+    def get(self, key):
+        "The formatted code cached under `key`, or `None` on a cache miss."
+        f = self._entry(key)
+        try: res = f.read_text()
+        except FileNotFoundError: return None
+        try: os.utime(f) # mark as recently used
+        except OSError: pass # evicted by another process, or a read-only cache
+        return res
+
+    def set(self, key, formatted):
+        "Cache `formatted` under `key`, and evict old entries once an eighth of `max_bytes` was written since the last eviction."
+        f = self._entry(key)
+        f.parent.mkdir(parents=True, exist_ok=True)
+        data = formatted.encode()
+        atomic_write(f, data)
+        self._written += len(data)
+        if self._written > self.max_bytes//8: self.evict()
+
+    def evict(self):
+        "Remove the least recently used entries until the cache is at most `max_bytes`."
+        self._written,entries = 0,[]
+        for f in self.path.glob('*/*'):
+            if f.name.startswith('.'): continue # being written by `atomic_write`
+            try: st = f.stat()
+            except FileNotFoundError: continue # evicted by another process
+            entries.append((st.st_mtime, st.st_size, f))
+        total = sum(size for _,size,_ in entries)
+        for _,size,f in sorted(entries):
+            if total <= self.max_bytes: break
+            f.unlink(missing_ok=True)
+            total -= size
+
+# Cell
+_re_script = re.compile(r'^!\s*python3?\s+(\S+\.py)\b', re.MULTILINE)
+_re_writefile = re.compile(r'^%%writefile\s+(?:-a\s+)?(\S+)', re.MULTILINE)
+
+def run_deps(fname, nb):
+    "The files that the notebook `nb` in `fname` depends on, besides its code."
+    code = [c.source for c in nb.cells if c.cell_type == 'code']
+    written = {m for src in code for m in _re_writefile.findall(src)}
+    scripts = [m for src in code for m in _re_script.findall(src) if m not in written]
+    deps = list(nb.metadata.get('nbdoc', {}).get('deps', [])) + scripts
+    return [Path(fname).parent/d for d in dict.fromkeys(deps)]
+
+# Cell
+class RunCache:
+    "An on-disk cache of the outputs of executed notebooks, keyed by their code, the flags and kernelspec they ran with, and the files they depend on."
+    def __init__(self, path=None):
+        self.path = Path(path) if path else default_cache_dir()/'run'
+
+    def key(self, fname, nb, flags=None, kernel='python3'):
+        "The cache key of the notebook `nb` in `fname` when it runs with `flags` in `kernel`."
+        if isinstance(flags, str): flags = flags.split()
+        h = hashlib.sha256(json.dumps([__version__, kernel, sorted(flags or [])]).encode())
+        for c in nb.cells:
+            if c.cell_type == 'code': h.update(f'{len(c.source)}\0{c.source}'.encode())
+        for f in run_deps(fname, nb): h.update(f'{f.name}\0{file_hash(f) if f.is_file() else ""}'.encode())
+        return h.hexdigest()
+
+    def _entry(self, key): return self.path/key[:2]/f'{key}.json'
+
+    def restore(self, nb, key):
+        "Copy the outputs cached under `key` into the code cells of `nb`, returns `False` on a cache miss."
+        try: cached = json.loads(self._entry(key).read_text())
+        except FileNotFoundError: return False
+        code = [c for c in nb.cells if c.cell_type == 'code']
+        if len(code) != len(cached['cells']): return False
+        from nbformat import from_dict
+        for c,o in zip(code, cached['cells']): c.execution_count,c.outputs = o['execution_count'],from_dict(o['outputs'])
+        if cached['language_info']: nb.metadata.language_info = from_dict(cached['language_info'])
+        return True
+
+    def store(self, nb, key):
+        "Cache the outputs of the code cells of the executed notebook `nb` under `key`."
+        cells = [{'execution_count': c.get('execution_count'), 'outputs': c.get('outputs', [])} for c in nb.cells if c.cell_type == 'code']
+        f = self._entry(key)
+        f.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write(f, json.dumps({'language_info': nb.metadata.get('language_info'), 'cells': cells}).encode()) # other workers may read it
\ No newline at end of file
@@ -1,51 +1,148 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/convert.ipynb (unless otherwise specified).
 
-__all__ = ['nb2md', 'parallel_nb2md', 'nbdoc_build']
+__all__ = ['nb2md', 'timing_report', 'parallel_nb2md', 'watch_nb2md', 'nbdoc_build']
 
 # Cell
-import os, sys
-from .mdx import get_mdx_exporter
+import os, sys, hashlib, json, time, nbdoc
+from .cache import BuildCache, exporter_fingerprint, file_hash, default_cache_dir, _black_version
+from .fileio import write_if_changed, atomic_write
+from .assets import default_asset_dir, gc_assets
+from .shard import Durations, shard_files, save_shard, build_outputs, schedule
+from .report import NbResult, write_reports
+from .workers import recycling_map
+from .watch import watch_nbs, nbglob
+from .daemon import daemon_request
+from nbdoc import __version__
 from typing import Union
-from nbdev.export import nbglob
-from nbconvert.exporters import Exporter
-from fastcore.all import Path, parallel, call_parse, bool_arg
+from nbdev.imports import get_config
+from fastcore.all import Path, L, parallel, ProcessPoolExecutor, call_parse, bool_arg, store_true
 
 # Cell
-def nb2md(fname:Union[str, Path], exp:Exporter):
-    "Convert a notebook in `fname` to a markdown file."
+_exp, _exp_args = None, None
+
+def _init_worker(template_file='ob.tpl', profile=False, validate=False, cache_dir=None):
+    "Build the MDX exporter and compile its template once in each worker process."
+    global _exp, _exp_args
+    if _exp_args == (template_file, profile, validate, cache_dir): return
+    from .mdx import get_mdx_exporter # nbconvert is only imported when notebooks are converted
+    _exp = get_mdx_exporter(template_file, profile=profile, validate=validate, cache_dir=cache_dir)
+    _exp_args = (template_file, profile, validate, cache_dir)
+    _exp.template
+
+def nb2md(fname:Union[str, Path], exp:'Exporter'=None):
+    "Convert a notebook in `fname` to a markdown file with `exp`, or the exporter of the current process, and return a `NbResult`."
     file = Path(fname)
     assert file.name.endswith('.ipynb'), f'{str(fname)} is not a notebook.'
     assert file.is_file(), f'file {str(fname)} not found.'
+    if exp is None:
+        if _exp is None: _init_worker()
+        exp = _exp
     print(f"converting: {str(file)}")
+    start = time.perf_counter()
     try:
         o,r = exp.from_filename(fname)
-        file.with_suffix('.md').write_text(o)
-        return True
+        write_if_changed(file.with_suffix('.md'), o) # leave the file and its mtime alone if nothing changed
+        return NbResult(file, 'build', duration=time.perf_counter()-start, output_bytes=len(o.encode()),
+                        assets=len(r.get('outputs', {})), timings=r.get('timings')) # the timings of a profiled exporter
     except Exception as e:
         print(e)
-        return False
+        return NbResult.failed(file, 'build', e, time.perf_counter()-start)
+
+# Cell
+_mdx_settings = ('output_max_bytes', 'output_max_lines', 'asset_dir', 'tst_flags') # the settings.ini keys that `get_mdx_exporter` and its preprocessors read
+
+def _mdx_fingerprint(cache_dir=None, template_file='ob.tpl'):
+    "`exporter_fingerprint` of `get_mdx_exporter`, memoized on disk so that builds with nothing to do don't import nbconvert."
+    src = Path(nbdoc.__file__).parent
+    cfg = get_config()
+    stamp = __version__ + _black_version() + json.dumps({k:cfg.get(k) for k in _mdx_settings}) + ''.join(file_hash(f) for f in [src/'mdx.py', src/'media.py', src/'templates'/template_file])
+    memo = Path(cache_dir or default_cache_dir())/'fingerprints'/hashlib.sha256(stamp.encode()).hexdigest()
+    if memo.exists(): return memo.read_text()
+    from .mdx import get_mdx_exporter
+    fp = exporter_fingerprint(get_mdx_exporter(template_file))
+    memo.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write(memo, fp.encode()) # other builds may read it at the same time
+    return fp
 
 # Cell
-def parallel_nb2md(basedir:Union[Path,str], exp:Exporter, recursive=True, force_all=False, n_workers=None, pause=0):
-    "Convert all notebooks in `dir` to markdown files."
+def timing_report(timings):
+    "Total the `timings` of each notebook per preprocessor, slowest first."
+    slowest = lambda d: dict(sorted(d.items(), key=lambda o: -o[1]['time']))
+    total = {}
+    for t in timings.values():
+        for name,v in t.items():
+            agg = total.setdefault(name, {'time':0., 'calls':0, 'cells':0})
+            for k in agg: agg[k] += v[k]
+    return {'preprocessors': slowest(total), 'notebooks': {str(f):slowest(t) for f,t in timings.items()}}
+
+def parallel_nb2md(basedir:Union[Path,str], exp:'Exporter'=None, recursive=True, force_all=False, n_workers=None, pause=0, cache_dir=None, template_file='ob.tpl', profile=None, shard=None, durations=None, report=None, junit=None, validate=False, max_tasks=None, max_rss=None):
+    """Convert all notebooks in `dir` to markdown files, with one MDX exporter per worker process if `exp` is None, and return their `NbResult`s.
+    Workers are restarted after `max_tasks` notebooks, or when they use more than `max_rss` MB, see `nbdoc.workers.recycling_map`."""
     files = nbglob(basedir, recursive=recursive).filter(lambda x: not x.name.startswith('Untitled'))
     if len(files)==1:
         force_all = True
         if n_workers is None: n_workers=0
+    durs = Durations(durations or Path(cache_dir or default_cache_dir())/'durations.json')
+    if shard: files = shard_files(files, shard, 'build', durs)
+    nbs = files
+    cache = BuildCache(cache_dir, exporter_fingerprint(exp) if exp else _mdx_fingerprint(cache_dir, template_file))
+    keys = {f:cache.key(f) for f in files}
     if not force_all:
-        # only rebuild modified files
+        # only rebuild notebooks whose content or exporter changed
         files,_files = [],files.copy()
         for fname in _files:
-            fname_out = fname.with_suffix('.md')
-            if not fname_out.exists() or os.path.getmtime(fname) >= os.path.getmtime(fname_out):
-                files.append(fname)
+            if cache.is_current(fname, keys[fname]): continue
+            if cache.restore(fname, keys[fname]): print(f"restored from cache: {str(fname)}")
+            else: files.append(fname)
+    results = L(NbResult(f, 'build', 'cached') for f in nbs if f not in files)
     if len(files)==0: print("No notebooks were modified.")
     else:
         if sys.platform == "win32": n_workers = 0
-        passed = parallel(nb2md, files, n_workers=n_workers, exp=exp,  pause=pause)
-        if not all(passed):
+        files = schedule(files, 'build', durs, n_workers) # start the longest notebooks first
+        if max_tasks or max_rss:
+            init = dict(initializer=_init_worker, initargs=(template_file, bool(profile), validate, cache_dir)) if exp is None else {}
+            res = recycling_map(nb2md, files, n_workers, max_tasks, max_rss, on_fail=lambda f,e: NbResult.failed(f, 'build', e), exp=exp, **init)
+        elif exp is None:
+            # each worker builds its exporter once instead of unpickling `exp` for every notebook
+            if n_workers==0: _init_worker(template_file, bool(profile), validate, cache_dir)
+            with ProcessPoolExecutor(n_workers, pause=pause, initializer=_init_worker, initargs=(template_file, bool(profile), validate, cache_dir)) as ex:
+                res = L(ex.map(nb2md, files))
+        else: res = parallel(nb2md, files, n_workers=n_workers, exp=exp,  pause=pause)
+        durs.update('build', {r.fname:r.duration for r in res if r}).save()
+        for r in res:
+            if r: cache.store(r.fname, keys[r.fname])
+        if profile:
+            timings = timing_report({r.fname:r.timings for r in res if r.timings})
+            Path(profile).write_text(json.dumps(timings, indent=2))
+            print(f"wrote preprocessor timings to {profile}")
+        if not all(res):
             msg = "Conversion failed on the following:\n"
-            print(msg + '\n'.join([f.name for p,f in zip(passed,files) if not p]))
+            print(msg + '\n'.join([r.fname.name for r in res if not r]))
+        results += res
+    store, nbs_path = default_asset_dir(), get_config().path('nbs_path')
+    if store and not shard and recursive and Path(basedir or nbs_path).resolve() == nbs_path.resolve():
+        unused = gc_assets(store, nbs_path) # every markdown file is up to date, so an asset that none refers to is unused
+        if unused: print(f"removed {len(unused)} unused assets from {store}")
+    write_reports(results, 'nbdoc_build', report, junit)
+    return results
+
+# Cell
+def watch_nb2md(basedir:Union[Path,str]=None, cache_dir=None, template_file='ob.tpl', poll=False):
+    "Convert notebooks in `basedir` to markdown files whenever they are saved, until interrupted."
+    path = Path(basedir) if basedir else get_config().path('nbs_path')
+    only = None
+    if path.is_file(): only,path = path,path.parent
+    _init_worker(template_file, cache_dir=cache_dir)
+    cache = BuildCache(cache_dir, exporter_fingerprint(_exp))
+    print(f"watching: {str(path)}")
+    try:
+        for files in watch_nbs(path, poll=poll):
+            for fname in sorted(files):
+                if only and fname.resolve() != only.resolve(): continue
+                key = cache.key(fname)
+                if cache.is_current(fname, key): continue
+                if nb2md(fname): cache.store(fname, key)
+    except KeyboardInterrupt: pass
 
 # Cell
 @call_parse
@@ -53,12 +150,44 @@ def nbdoc_build(
     srcdir:str=None,  # A directory of notebooks to convert to docs recursively, can also be a filename.
     force_all:bool_arg=False, # Rebuild even notebooks that havent changed
     n_workers:int=None,  # Number of workers to use
-    pause:float=0.5  # Pause time (in secs) between notebooks to avoid race conditions
+    pause:float=0,  # Pause time (in secs) between starting notebooks
+    max_tasks:int=None,  # Restart each worker process after converting this many notebooks
+    max_rss:int=None,  # Restart a worker that uses more than this many MB, and convert its notebook again in a new process
+    cache_dir:str=None,  # Directory of the build cache, defaults to `cache_dir` in settings.ini or `.nbdoc_cache`
+    durations:str=None,  # JSON file of the durations of notebooks that shards are split by, defaults to `durations.json` in the build cache
+    watch:store_true=False,  # Keep running and convert notebooks again whenever they are saved
+    no_daemon:store_true=False,  # Convert notebooks in this process even if `nbdoc_serve` is running
+    profile:str=None,  # Write the time spent in each preprocessor to this JSON file
+    shard:str=None,  # Only build part `i` of `N`, written as `i/N`, and save its outputs for `nbdoc_merge`
+    shard_dir:str=None,  # Where to save the outputs of the shard, defaults to `shards` in the build cache
+    report:str=None,  # Write the result of each notebook to this JSON file
+    junit:str=None,  # Write the result of each notebook to this JUnit XML file
+    validate:store_true=False  # Check notebooks against the nbformat schema when they are read and after every preprocessor
 ):
     "Build the documentation by converting notebooks in `srcdir` to markdown"
-    parallel_nb2md(basedir=srcdir,
-                   exp=get_mdx_exporter(),
-                   recursive=True,
-                   force_all=force_all,
-                   n_workers=n_workers,
-                   pause=pause)
\ No newline at end of file
+    if not (watch or no_daemon or shard):
+        kwargs = dict(basedir=srcdir, force_all=force_all, n_workers=n_workers, cache_dir=cache_dir, durations=durations, profile=profile, report=report, junit=junit,
+                      validate=validate, max_tasks=max_tasks, max_rss=max_rss)
+        ok = daemon_request('build', **kwargs)
+        if ok is not None:
+            if not ok: sys.exit(1) # the daemon failed, so that pre-commit hooks fail too
+            return
+    res = parallel_nb2md(basedir=srcdir,
+                         recursive=True,
+                         force_all=force_all,
+                         n_workers=n_workers,
+                         pause=pause,
+                         max_tasks=max_tasks,
+                         max_rss=max_rss,
+                         cache_dir=cache_dir,
+                         durations=durations,
+                         profile=profile,
+                         shard=shard,
+                         report=report,
+                         junit=junit,
+                         validate=validate)
+    if shard:
+        nbs, durs = res.attrgot('fname'), Durations(durations or Path(cache_dir or default_cache_dir())/'durations.json')
+        base = Path(srcdir or get_config().path('nbs_path'))
+        save_shard(shard, 'build', nbs, build_outputs(nbs), durs, shard_dir, base if base.is_dir() else base.parent)
+    if watch: watch_nb2md(basedir=srcdir, cache_dir=cache_dir)
\ No newline at end of file
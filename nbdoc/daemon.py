@@ -0,0 +1,113 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/daemon.ipynb (unless otherwise specified).
+
+__all__ = ['default_socket', 'daemon_request', 'NbdocServer', 'nbdoc_serve']
+
+# Cell
+import contextlib, json, os, socket, socketserver
+from nbdev.imports import get_config
+from fastcore.xtras import Path
+from fastcore.script import call_parse, store_true
+from .cache import default_cache_dir
+
+# Cell
+def default_socket():
+    "The Unix domain socket of the daemon, which lives in the build cache directory."
+    return default_cache_dir()/'nbdoc.sock'
+
+def daemon_request(cmd, sock=None, **kwargs):
+    "Ask the daemon listening on `sock` to run `cmd` and print its output, returns `None` if no daemon is running."
+    sock = Path(sock) if sock else default_socket()
+    if not hasattr(socket, 'AF_UNIX') or not sock.exists(): return None
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try: s.connect(str(sock))
+    except OSError:
+        s.close()
+        return None
+    with s, s.makefile('rwb') as f:
+        f.write((json.dumps({'cmd': cmd, 'cwd': os.getcwd(), 'kwargs': kwargs})+'\n').encode())
+        f.flush()
+        for line in f:
+            msg = json.loads(line)
+            if 'out' in msg: print(msg['out'], end='')
+            else:
+                if not msg['ok']: print(msg['error'])
+                return msg['ok']
+    return False
+
+# Cell
+class _SocketWriter:
+    "A file-like object that sends everything written to it to the client as JSON lines."
+    def __init__(self, wfile): self.wfile = wfile
+
+    def write(self, s):
+        try: self.wfile.write((json.dumps({'out': s})+'\n').encode())
+        except OSError: pass # the client went away, finish the work anyway
+        return len(s)
+
+    def flush(self): pass
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        req = json.loads(self.rfile.readline())
+        ok, err, cwd = True, None, os.getcwd()
+        try:
+            os.chdir(req.get('cwd', cwd))
+            with contextlib.redirect_stdout(_SocketWriter(self.wfile)): self.server.run(req['cmd'], **req.get('kwargs', {}))
+        except Exception as e: ok, err = False, f'{type(e).__name__}: {e}'
+        finally: os.chdir(cwd)
+        self.wfile.write((json.dumps({'ok': ok, 'error': err})+'\n').encode())
+
+# Cell
+def _settings():
+    "The settings.ini of the working directory and its content, read again even though `get_config` is cached."
+    get_config.cache_clear()
+    f = get_config().config_file
+    return f, f.read_bytes()
+
+class NbdocServer(socketserver.UnixStreamServer):
+    "A daemon that converts notebooks and builds indexes with a warm exporter, one request at a time."
+    def __init__(self, sock=None, template_file='ob.tpl'):
+        # `nbdoc.convert` and `nbdoc.docindex` are clients of this module, so they are imported here
+        from nbdoc import convert, docindex
+        self.convert, self.docindex, self.template_file = convert, docindex, template_file
+        self.sock = Path(sock) if sock else default_socket()
+        if daemon_request('ping', sock=self.sock): raise OSError(f'A daemon is already listening on {self.sock}')
+        self.sock.unlink(missing_ok=True) # left behind by a daemon that did not shut down cleanly
+        self.sock.parent.mkdir(parents=True, exist_ok=True)
+        convert._init_worker(template_file)
+        self.settings, self.stopping = _settings(), False
+        super().__init__(str(self.sock), _Handler)
+
+    def run(self, cmd, **kwargs):
+        "Run `cmd` with `kwargs` in this process."
+        if cmd == 'ping': return
+        elif cmd == 'stop': self.stopping = True
+        elif _settings() != self.settings:
+            raise RuntimeError(f'{self.settings[0]} changed or belongs to another project since the daemon started, restart `nbdoc_serve`')
+        elif cmd in ('build', 'convert'):
+            # a single notebook is converted in this process, and forked workers inherit its warm exporter
+            self.convert.parallel_nb2md(template_file=self.template_file, recursive=True, **kwargs)
+        elif cmd == 'index': self.docindex.build_index(**kwargs)
+        elif cmd == 'linkify': self.docindex.NbdevLookup(**kwargs).update_markdown()
+        else: raise ValueError(f'Unknown command: {cmd}')
+
+    def serve(self):
+        "Handle requests until a client sends `stop`."
+        print(f"nbdoc daemon listening on {self.sock}")
+        try:
+            while not self.stopping: self.handle_request()
+        except KeyboardInterrupt: pass
+        finally:
+            self.server_close()
+            self.sock.unlink(missing_ok=True)
+
+# Cell
+@call_parse
+def nbdoc_serve(
+    sock:str=None,  # Path of the Unix domain socket, defaults to `nbdoc.sock` in the build cache directory
+    stop:store_true=False  # Stop the daemon that is listening on `sock`
+):
+    "Start a daemon that keeps the MDX exporter warm, so that `nbdoc_build` and `nbdoc_linkify` start quickly."
+    if stop:
+        if daemon_request('stop', sock=sock) is None: print("No daemon is running.")
+    else: NbdocServer(sock).serve()
\ No newline at end of file
@@ -1,16 +1,19 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/docindex.ipynb (unless otherwise specified).
 
-__all__ = ['mdglob', 'build_index', 'get_idx', 'NbdevLookup', 'nbdoc_linkify']
+__all__ = ['mdglob', 'index_md', 'build_index', 'get_idx', 'NbdevLookup', 'nbdoc_linkify']
 
 # Cell
 from functools import partial
-import re
+import re, sys
 from pprint import pformat
 import json
-from nbdev.export import nbglob, get_config
+from nbdev.imports import get_config
+from .watch import nbglob
 from fastcore.utils import Path, urlread
 from fastcore.basics import merge
 from fastcore.script import call_parse, Param, store_false, store_true
+from .daemon import daemon_request
+from .fileio import write_if_changed
 
 _re_name = re.compile(r'<DocSection type="(?!decorator)\S+" name="(\S+)"')
 _re_decname = re.compile(r'<DocSection type="decorator" name="(\S+)"')
@@ -31,9 +34,8 @@ def _get_md_path(path):
 def _get_md_files(path): return mdglob(_get_md_path(path))
 
 # Cell
-def build_index(path=None, update_existing=False):
-    "Build an index of names generated with `ShowDoc` to document paths."
-    path = _get_md_path(path)
+def _doc_url():
+    "The URL of the docs, built from `doc_host` and `doc_baseurl` in settings.ini."
     cfg = get_config()
     doc_host = cfg['doc_host']
     base_url = cfg['doc_baseurl']
@@ -41,11 +43,15 @@ def build_index(path=None, update_existing=False):
     if doc_host.endswith('/'): doc_host = doc_host[:-1]
     if not base_url.startswith('/'): base_url = '/' + base_url
     if not base_url.endswith('/'): base_url += '/'
-    doc_url = doc_host + base_url
+    return doc_host + base_url
 
+def index_md(files, path=None):
+    "Index of the names generated with `ShowDoc` in the markdown `files` to their paths in the docs in `path`."
+    path = _get_md_path(path)
+    doc_url = _doc_url()
     reverse_idx = {}
-    for f in _get_md_files(path):
-        txt = f.read_text()
+    for f in files:
+        txt = Path(f).read_text()
         decnames = [_add_at(s) for s in _re_decname.findall(txt)]
         names = _re_name.findall(txt)
         slug_match = _re_slug.search(txt)
@@ -53,14 +59,21 @@ def build_index(path=None, update_existing=False):
         if slug_match:
             doc_path = slug_match.group(1)
         else:
-            doc_path = str(f.relative_to(path).with_suffix(''))
+            doc_path = str(Path(f).relative_to(path).with_suffix(''))
 
         for n in names+decnames: reverse_idx[n] = doc_url + doc_path + f'#{n}'
+    return reverse_idx
+
+def build_index(path=None, update_existing=False):
+    "Build an index of names generated with `ShowDoc` to document paths."
+    path = _get_md_path(path)
+    cfg = get_config()
+    reverse_idx = index_md(_get_md_files(path), path)
     if update_existing:
         idx = cfg.config_path/'_nbdoc_index.json'
         if idx.exists(): return merge(idx.read_json(), reverse_idx)
     if reverse_idx:
-        (cfg.config_path/'_nbdoc_index.json').write_text(f'{json.dumps(reverse_idx, indent=4)}')
+        write_if_changed(cfg.config_path/'_nbdoc_index.json', f'{json.dumps(reverse_idx, indent=4)}')
     return reverse_idx
 
 # Cell
@@ -108,8 +121,7 @@ class NbdevLookup:
         self.build_syms()
         if self.syms:
             for f in self.mdfiles:
-                print(f'Updating: {str(f)}')
-                f.write_text(self.linkify(f.read_text()))
+                if write_if_changed(f, self.linkify(f.read_text())): print(f'Updating: {str(f)}')
 
 # Cell
 @call_parse
@@ -117,7 +129,12 @@ def nbdoc_linkify(
     local:Param('Whether or not to build an index based on local documents', store_false),
     keep_existing:Param('Whether or not to keep existing index', store_true),
     md_path:Param('Root path to search recursively containing markdown files to linkify', str)=None,
+    no_daemon:Param('Linkify in this process even if `nbdoc_serve` is running', store_true)=False,
 ):
     "Convert names in `backticks` in markdown files that have been documented with nbdoc.showdoc.ShowDoc to appropriate links."
+    ok = None if no_daemon else daemon_request('linkify', local=local, md_path=md_path, update_existing=keep_existing)
+    if ok is not None:
+        if not ok: sys.exit(1) # the daemon failed, so that pre-commit hooks fail too
+        return
     nl = NbdevLookup(local=local, md_path=md_path, update_existing=keep_existing)
     nl.update_markdown()
\ No newline at end of file
@@ -0,0 +1,79 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/fileio.ipynb (unless otherwise specified).
+
+__all__ = ['atomic_write', 'write_if_changed', 'write_chunks', 'read_nb']
+
+# Cell
+import hashlib, os, threading
+from fastcore.xtras import Path
+try: from orjson import loads as _loads # optional, parses large notebooks faster
+except ImportError: from json import loads as _loads
+
+# Cell
+def _tmp_name(fname): return fname.with_name(f'.{fname.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+
+def atomic_write(fname, data:bytes):
+    "Write `data` to `fname` through a temporary file in the same directory, such that readers never see a partial file."
+    fname = Path(fname)
+    tmp = _tmp_name(fname)
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, fname)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+def _same_content(fname, data):
+    "Whether `fname` exists and contains exactly `data`."
+    try:
+        if os.stat(fname).st_size != len(data): return False
+        with open(fname, 'rb') as f: return f.read() == data
+    except FileNotFoundError: return False
+
+def write_if_changed(fname, data, encoding='utf-8'):
+    "Atomically write `data`, a `str` or `bytes`, to `fname` unless it already has this content. Returns whether `fname` was written."
+    if isinstance(data, str): data = data.encode(encoding)
+    if _same_content(fname, data): return False
+    atomic_write(fname, data)
+    return True
+
+# Cell
+def _same_digest(fname, size, digest):
+    "Whether `fname` exists and has `size` bytes with the sha256 hex digest `digest`."
+    try:
+        if os.stat(fname).st_size != size: return False
+        h = hashlib.sha256()
+        with open(fname, 'rb') as f:
+            for chunk in iter(lambda: f.read(1<<20), b''): h.update(chunk)
+        return h.hexdigest() == digest
+    except FileNotFoundError: return False
+
+def write_chunks(fname, chunks, name=None):
+    """Atomically write the bytes in `chunks` to `fname` unless it already has this content, holding one chunk in memory at a time.
+    If `name` is given, `fname` is a directory and the file is named `name(digest)`, and isn't written again if it exists.  Returns the path and the sha256 hex digest of the content."""
+    fname = Path(fname)
+    tmp, h, size = _tmp_name(fname/'chunks' if name else fname), hashlib.sha256(), 0
+    try:
+        with open(tmp, 'wb') as f:
+            for chunk in chunks:
+                h.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        digest = h.hexdigest()
+        if name: fname = fname/name(digest)
+        if fname.exists() if name else _same_digest(fname, size, digest): tmp.unlink()
+        else: os.replace(tmp, fname)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return fname, digest
+
+# Cell
+def read_nb(fname, validate=False):
+    "Read the notebook in `fname`, a path or an open file, as nbformat 4, and raise a `ValidationError` if `validate` and it doesn't match the schema."
+    import nbformat
+    s = fname.read() if hasattr(fname, 'read') else Path(fname).read_bytes()
+    d = _loads(s)
+    if d.get('nbformat') == 4: nb = nbformat.v4.to_notebook_json(d) # what `nbformat.read` does, without validating
+    else: nb = nbformat.reads(s if isinstance(s, str) else s.decode('utf-8'), as_version=4) # older versions are converted
+    if validate: nbformat.validate(nb)
+    return nb
\ No newline at end of file
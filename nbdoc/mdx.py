@@ -1,8 +1,10 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/mdx.ipynb (unless otherwise specified).
 
-__all__ = ['InjectMeta', 'StripAnsi', 'InsertWarning', 'RmEmptyCode', 'MetaflowTruncate', 'UpdateTags',
-           'MetaflowSelectSteps', 'FilterOutput', 'Limit', 'HideInputLines', 'WriteTitle', 'CleanFlags', 'CleanMagics',
-           'Black', 'black_mode', 'CatFiles', 'BashIdentify', 'CleanShowDoc', 'get_mdx_exporter']
+__all__ = ['InjectMeta', 'StripAnsi', 'InsertWarning', 'RmEmptyCode', 'MetaflowTruncate', 'UpdateTags', 'LineFilter',
+           'line_filter', 'MetaflowSelectSteps', 'FilterOutput', 'budget_text', 'OutputBudget', 'SelectedOutputBudget',
+           'Limit', 'HideInputLines', 'WriteTitle', 'CleanFlags', 'CleanMagics', 'Black', 'black_cache', 'black_mode',
+           'CatFiles', 'BashIdentify', 'CleanShowDoc', 'FusedPreprocessor', 'fuse_preprocessors', 'named_preprocessors',
+           'time_preprocessors', 'MdxExporter', 'get_mdx_exporter']
 
 # Cell
 from nbconvert.preprocessors import Preprocessor
@@ -10,11 +12,14 @@ from nbconvert import MarkdownExporter
 from nbconvert.preprocessors import TagRemovePreprocessor
 from nbdev.imports import get_config
 from traitlets.config import Config
+from traitlets import Integer, Unicode
 from pathlib import Path
-import re, uuid
+from functools import lru_cache
+import re, hashlib, time
 from fastcore.basics import AttrDict
 from .media import ImagePath, ImageSave, HTMLEscape
-from black import format_str, Mode
+from .cache import FormatCache, _black_version
+from .fileio import read_nb as _read_nb # `read_nb` of nbdev is used in the tests below
 
 # Cell
 _re_meta= r'^\s*#(?:cell_meta|meta):\S+\s*[\n\r]'
@@ -25,6 +30,7 @@ class InjectMeta(Preprocessor):
     Allows you to inject metadata into a cell for further preprocessing with a comment.
     """
     pattern = r'(^\s*#(?:cell_meta|meta):)(\S+)(\s*[\n\r])'
+    cell_types,source_has = ('code',),'meta:'
 
     def preprocess_cell(self, cell, resources, index):
         if cell.cell_type == 'code' and re.search(_re_meta, cell.source, flags=re.MULTILINE):
@@ -43,6 +49,7 @@ _re_ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
 
 class StripAnsi(Preprocessor):
     """Strip Ansi Characters."""
+    needs = ('stdout',)
 
     def preprocess_cell(self, cell, resources, index):
         for o in cell.get('outputs', []):
@@ -51,14 +58,14 @@ class StripAnsi(Preprocessor):
         return cell, resources
 
 # Cell
-def _get_cell_id(id_length=36):
-    "generate random id for artifical notebook cell"
-    return uuid.uuid4().hex[:id_length]
+def _get_cell_id(content='', id_length=36):
+    "generate an id for an artifical notebook cell from its `content`, such that builds are reproducible"
+    return hashlib.sha256(content.encode()).hexdigest()[:id_length]
 
 def _get_md_cell(content="<!-- WARNING: THIS FILE WAS AUTOGENERATED! DO NOT EDIT! Instead, edit the notebook w/the location & name as this file. -->"):
     "generate markdown cell with content"
     cell = AttrDict({'cell_type': 'markdown',
-                     'id': f'{_get_cell_id()}',
+                     'id': f'{_get_cell_id(content)}',
                      'metadata': {},
                      'source': f'{content}'})
     return cell
@@ -86,16 +93,26 @@ class RmEmptyCode(Preprocessor):
         return nb, resources
 
 # Cell
+def _drop_preamble(text):
+    "`text` from the newline before its last `Workflow starting`, if `Metaflow`, `Validating` and `The graph` are printed in that order before it."
+    start = text.rfind('Workflow starting', 0, len(text)-1) # followed by at least one character
+    nl = text.rfind('\n', 0, start-1) if start > 0 else -1 # at least one character before `Workflow starting`
+    if nl < 0: return text
+    i = text.find('Metaflow', 0, nl)
+    j = text.find('Validating', i+8, nl) if i >= 0 else -1
+    k = text.find('The graph', j+11, nl-1) if j >= 0 else -1
+    return text[nl:] if k >= 0 else text
+
 class MetaflowTruncate(Preprocessor):
     """Remove the preamble and timestamp from Metaflow output."""
-    _re_pre = re.compile(r'([\s\S]*Metaflow[\s\S]*Validating[\s\S]+The graph[\s\S]+)(\n[\s\S]+Workflow starting[\s\S]+)')
     _re_time = re.compile('\d{4}-\d{2}-\d{2}\s\d{2}\:\d{2}\:\d{2}.\d{3}')
+    needs,source_has = ('outputs',),'python'
 
     def preprocess_cell(self, cell, resources, index):
         if re.search('\s*python.+run.*', cell.source) and 'outputs' in cell:
             for o in cell.outputs:
                 if o.name == 'stdout':
-                    o['text'] = self._re_time.sub('', self._re_pre.sub(r'\2', o.text)).strip()
+                    o['text'] = self._re_time.sub('', _drop_preamble(o.text)).strip()
         return cell, resources
 
 # Cell
@@ -103,6 +120,7 @@ class UpdateTags(Preprocessor):
     """
     Create cell tags based upon comment `#cell_meta:tags=<tag>`
     """
+    needs = ('nbdoc',)
 
     def preprocess_cell(self, cell, resources, index):
         root = cell.metadata.get('nbdoc', {})
@@ -110,25 +128,63 @@ class UpdateTags(Preprocessor):
         if tags: cell.metadata['tags'] = cell.metadata.get('tags', []) + tags.split(',')
         return cell, resources
 
+# Cell
+_re_special = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+def _trie_pattern(words):
+    "A regular expression that matches any of `words`, in which words with a common prefix share a branch."
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w: node = node.setdefault(ch, {})
+        node[''] = {} # a word ends here
+    def _pattern(node):
+        alts = [re.escape(ch) + _pattern(n) for ch,n in sorted(node.items()) if ch]
+        if not alts: return ''
+        p = alts[0] if len(alts) == 1 else '(?:' + '|'.join(alts) + ')'
+        return f'(?:{p})?' if '' in node else p
+    return _pattern(trie)
+
+class LineFilter:
+    "Select lines of output by the Metaflow step that printed them, or by whether they contain one of `words`."
+    def __init__(self, steps='', words=''):
+        self.steps,words = [s for s in steps.split(',') if s],[w for w in words.split(',') if w]
+        self.re_step = re.compile(r'\d+/({})/\d+\s\(pid\s\d+\)'.format('|'.join(map(re.escape, self.steps)))) if self.steps else None
+        # words can be regular expressions, but plain words are matched with a trie, which stays fast for many words
+        self.re_word = re.compile('|'.join(words) if any(_re_special.search(w) for w in words) else _trie_pattern(words)) if words else None
+
+    def select_steps(self, text):
+        "The lines of `text` that were printed by each of `steps` in turn, separated by `...`, or `text` if there are no `steps`."
+        if self.re_step is None: return text
+        found = {s:[] for s in self.steps}
+        for l in text.split('\n'):
+            m = self.re_step.search(l)
+            if m: found[m.group(1)].append(l)
+        return '\n'.join(['...'] + [l for s in self.steps if found[s] for l in found[s] + ['...']])
+
+    def drop_words(self, text):
+        "The lines of `text` that don't contain any of `words`, or `text` if there are no `words`."
+        if self.re_word is None: return text
+        return '\n'.join(l for l in text.splitlines() if not self.re_word.search(l))
+
+@lru_cache(maxsize=1024)
+def line_filter(steps='', words=''):
+    "The `LineFilter` for the comma separated `steps` and `words` of a cell's metadata."
+    return LineFilter(steps, words)
+
 # Cell
 class MetaflowSelectSteps(Preprocessor):
     """
     Hide Metaflow steps in output based on cell metadata.
     """
-    re_step = r'.*\d+/{0}/\d+\s\(pid\s\d+\).*'
+    needs,source_has = ('nbdoc','outputs'),'python'
 
     def preprocess_cell(self, cell, resources, index):
         root = cell.metadata.get('nbdoc', {})
         steps = root.get('show_steps', root.get('show_step'))
         if re.search('\s*python.+run.*', cell.source) and 'outputs' in cell and steps:
             for o in cell.outputs:
-                if o.name == 'stdout':
-                    final_steps = []
-                    for s in steps.split(','):
-                        found_steps = re.compile(self.re_step.format(s)).findall(o['text'])
-                        if found_steps:
-                            final_steps += found_steps + ['...']
-                    o['text'] = '\n'.join(['...'] + final_steps)
+                if o.name == 'stdout': o['text'] = line_filter(steps).select_steps(o['text'])
         return cell, resources
 
 # Cell
@@ -136,22 +192,81 @@ class FilterOutput(Preprocessor):
     """
     Hide Output Based on Keywords.
     """
+    needs = ('nbdoc','outputs')
     def preprocess_cell(self, cell, resources, index):
         root = cell.metadata.get('nbdoc', {})
         words = root.get('filter_words', root.get('filter_word'))
         if 'outputs' in cell and words:
-            _re = f"^(?!.*({'|'.join(words.split(','))}))"
             for o in cell.outputs:
-                if o.name == 'stdout':
-                    filtered_lines = [l for l in o['text'].splitlines() if re.findall(_re, l)]
-                    o['text'] = '\n'.join(filtered_lines)
+                if o.name == 'stdout': o['text'] = line_filter(words=words).drop_words(o['text'])
+        return cell, resources
+
+# Cell
+def _fit(lines, n, size, tail=False):
+    "The leading (or trailing if `tail`) `lines` that fit in `n` lines and `size` bytes, cutting the first line if it is too big on its own."
+    out = []
+    for l in (reversed(lines) if tail else lines):
+        b = len(l.encode())
+        if len(out) == n or b > size:
+            if not out and n and size > 0: # e.g. a progress bar that is written on one line
+                l = l.encode()
+                out.append((l[-size:] if tail else l[:size]).decode(errors='ignore'))
+            break
+        out.append(l)
+        size -= b
+    return out[::-1] if tail else out
+
+def budget_text(text, max_bytes=0, max_lines=0):
+    "Keep the head and tail of `text` within `max_bytes` and `max_lines`, with an elision marker in between.  A limit of 0 is no limit."
+    if not (max_bytes or max_lines): return text
+    n_bytes = len(text.encode())
+    fits = not max_bytes or n_bytes <= max_bytes
+    if fits and (not max_lines or text.count('\n') < max_lines): return text
+    lines = text.splitlines(keepends=True)
+    if fits and len(lines) <= max_lines: return text
+    n = (max_lines-max_lines//2, max_lines//2) if max_lines else (len(lines),)*2
+    size = (max_bytes-max_bytes//2, max_bytes//2) if max_bytes else (n_bytes,)*2
+    head = _fit(lines, n[0], size[0])
+    rest = lines[len(head):]
+    if head and head[-1] != lines[len(head)-1]: rest.insert(0, lines[len(head)-1][len(head[-1]):]) # the rest of a line that was cut
+    tail = _fit(rest, n[1], size[1], tail=True)
+    head, tail, n_lines = ''.join(head), ''.join(tail), len(rest) - len(tail)
+    marker = f"... [{n_lines} lines, {n_bytes - len(head.encode()) - len(tail.encode())} bytes omitted] ...\n"
+    return (head if not head or head.endswith('\n') else head + '\n') + marker + tail
+
+# Cell
+_selectors = ('show_steps', 'show_step', 'filter_words', 'filter_word') # metadata of cells that select lines of their output
+
+class OutputBudget(Preprocessor):
+    """
+    Cap `stdout` and `stderr` at `max_bytes` and `max_lines`, keeping their head and tail, in cells that don't select lines of their output.
+    """
+    max_bytes = Integer(0, help="The maximum number of bytes of each stream output, 0 for no limit.").tag(config=True)
+    max_lines = Integer(0, help="The maximum number of lines of each stream output, 0 for no limit.").tag(config=True)
+    cell_types,needs = ('code',),('outputs',)
+    selected = False
+
+    def preprocess_cell(self, cell, resources, index):
+        root = cell.metadata.get('nbdoc', {})
+        if any(k in root for k in _selectors) != self.selected: return cell, resources
+        max_bytes, max_lines = int(root.get('max_bytes', self.max_bytes)), int(root.get('max_lines', self.max_lines))
+        for o in cell.get('outputs', []):
+            if o.output_type == 'stream': o['text'] = budget_text(o.text, max_bytes, max_lines)
         return cell, resources
 
+# Cell
+class SelectedOutputBudget(OutputBudget):
+    """
+    Cap `stdout` and `stderr` like `OutputBudget`, in cells that select lines of their output, after the selection.
+    """
+    selected = True
+
 # Cell
 class Limit(Preprocessor):
     """
     Limit The Number of Lines Of Output Based on Keywords.
     """
+    needs = ('nbdoc','outputs')
     def preprocess_cell(self, cell, resources, index):
         root = cell.metadata.get('nbdoc', {})
         n = root.get('limit')
@@ -167,6 +282,7 @@ class HideInputLines(Preprocessor):
     Hide lines of code in code cells with the comment `#meta_hide_line` at the end of a line of code.
     """
     tok = '#meta_hide_line'
+    cell_types,source_has = ('code',),tok
 
     def preprocess_cell(self, cell, resources, index):
         if cell.cell_type == 'code':
@@ -178,6 +294,7 @@ class HideInputLines(Preprocessor):
 class WriteTitle(Preprocessor):
     """Modify the code-fence with the filename upon %%writefile cell magic."""
     pattern = r'(^[\S\s]*%%writefile\s)(\S+)\n'
+    source_has = '%%writefile'
 
     def preprocess_cell(self, cell, resources, index):
         m = re.match(self.pattern, cell.source)
@@ -192,15 +309,17 @@ class WriteTitle(Preprocessor):
         return cell, resources
 
 # Cell
-_tst_flags = get_config()['tst_flags'].split('|')
+@lru_cache(maxsize=None)
+def _flag_patterns():
+    "Patterns of the `tst_flags` in settings.ini, which is only read when notebooks are converted."
+    return [re.compile(r'^#\s*{0}\s*'.format(f), re.MULTILINE) for f in get_config()['tst_flags'].split('|')]
 
 class CleanFlags(Preprocessor):
     """A preprocessor to remove Flags"""
-    patterns = [re.compile(r'^#\s*{0}\s*'.format(f), re.MULTILINE) for f in _tst_flags]
-
+    cell_types = ('code',)
     def preprocess_cell(self, cell, resources, index):
         if cell.cell_type == 'code':
-            for p in self.patterns:
+            for p in _flag_patterns():
                 cell.source = p.sub('', cell.source).strip()
         return cell, resources
 
@@ -208,6 +327,7 @@ class CleanFlags(Preprocessor):
 class CleanMagics(Preprocessor):
     """A preprocessor to remove cell magic commands and #cell_meta: comments"""
     pattern = re.compile(r'(^\s*(%%|%).+?[\n\r])|({0})'.format(_re_meta), re.MULTILINE)
+    cell_types = ('code',)
 
     def preprocess_cell(self, cell, resources, index):
         if cell.cell_type == 'code':
@@ -215,20 +335,50 @@ class CleanMagics(Preprocessor):
         return cell, resources
 
 # Cell
-black_mode = Mode()
+#nbdev_comment _all_ = ['black_mode'] # the `black.Mode` that code is formatted with, see `__getattr__`
+black_cache = None # a `nbdoc.cache.FormatCache`, defaults to the `format` directory of the build cache
+
+def _black_settings(mode):
+    "The installed version of black and the cache key of `mode`, which is black's default `Mode()` if None."
+    return f"black {_black_version()} {'default' if mode is None or mode == type(mode)() else mode.get_cache_key()}"
+
+@lru_cache(maxsize=None)
+def _format_cache(cache_dir=''): return FormatCache(Path(cache_dir)/'format' if cache_dir else None)
+
+def _format_black(src, cache_dir=''):
+    "Format `src` with black, unless black formatted it before with the same version and mode."
+    mode = globals().get('black_mode') # `black_mode` is only set once it is used or assigned
+    cache = black_cache or _format_cache(cache_dir)
+    key = cache.key(src, _black_settings(mode))
+    res = cache.get(key)
+    if res is None:
+        from black import format_str, Mode # black is slow to import, so only import it when it is needed
+        res = format_str(src_contents=src, mode=mode or Mode())
+        cache.set(key, res)
+    return res
 
 class Black(Preprocessor):
     """Format code that has a cell tag `black`"""
+    cache_dir = Unicode('', help="The build cache, where formatted code is kept in `format`, defaults to `cache_dir` in settings.ini.").tag(config=True)
+    cell_types = ('code',)
     def preprocess_cell(self, cell, resources, index):
         tags = cell.metadata.get('tags', [])
-        if cell.cell_type == 'code' and 'black' in tags:
-            cell.source = format_str(src_contents=cell.source, mode=black_mode).strip()
+        if cell.cell_type == 'code' and 'black' in tags: cell.source = _format_black(cell.source, self.cache_dir).strip()
         return cell, resources
 
+# Internal Cell
+def __getattr__(name):
+    "`black_mode` is black's default `Mode()` until it is assigned, and is only created when it is used, because black is slow to import."
+    if name != 'black_mode': raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from black import Mode
+    globals()['black_mode'] = Mode()
+    return globals()['black_mode']
+
 # Cell
 class CatFiles(Preprocessor):
     """Cat arbitrary files with %cat"""
     pattern = '^\s*!'
+    cell_types,source_has = ('code',),'!'
 
     def preprocess_cell(self, cell, resources, index):
         if cell.cell_type == 'code' and re.search(self.pattern, cell.source):
@@ -240,6 +390,7 @@ class CatFiles(Preprocessor):
 class BashIdentify(Preprocessor):
     """A preprocessor to identify bash commands and mark them appropriately"""
     pattern = re.compile('^\s*!', flags=re.MULTILINE)
+    cell_types,source_has = ('code',),'!'
 
     def preprocess_cell(self, cell, resources, index):
         if cell.cell_type == 'code' and self.pattern.search(cell.source):
@@ -261,6 +412,7 @@ def _isShowDoc(cell):
 class CleanShowDoc(Preprocessor):
     """Ensure that ShowDoc output gets cleaned in the associated notebook."""
     _re_html = re.compile(r'<HTMLRemove>.*</HTMLRemove>', re.DOTALL)
+    cell_types,source_has = ('code',),'ShowDoc'
 
     def preprocess_cell(self, cell, resources, index):
         "Convert cell to a raw cell with just the stripped portion of the output."
@@ -275,18 +427,105 @@ class CleanShowDoc(Preprocessor):
         return cell, resources
 
 # Cell
-def get_mdx_exporter(template_file='ob.tpl'):
-    """A mdx notebook exporter which composes many pre-processors together."""
+def _relevance(pp):
+    "The `cell_types`, `needs` and `source_has` that preprocessor `pp` declares, which default to every cell."
+    return getattr(pp, 'cell_types', None), getattr(pp, 'needs', ()), getattr(pp, 'source_has', None)
+
+def _applies(cell, cell_types, needs, source_has):
+    "Whether a preprocessor with this relevance can change `cell`."
+    if cell_types and cell.cell_type not in cell_types: return False
+    if source_has and source_has not in cell.source: return False
+    if 'nbdoc' in needs and 'nbdoc' not in cell.metadata: return False
+    if 'outputs' in needs and not cell.get('outputs'): return False
+    if 'stdout' in needs and not any(o.get('name') == 'stdout' for o in cell.get('outputs', [])): return False
+    return True
+
+class FusedPreprocessor:
+    "Run the cell-wise preprocessors `pps` in one pass over the cells, calling each one only on the cells it applies to."
+    def __init__(self, pps): self.pps = [(p, _relevance(p)) for p in pps]
+
+    def __call__(self, nb, resources):
+        for index, cell in enumerate(nb.cells):
+            for p,rel in self.pps:
+                # relevance is checked on the cell as the previous preprocessors left it
+                if _applies(cell, *rel): cell, resources = p.preprocess_cell(cell, resources, index)
+            nb.cells[index] = cell
+        return nb, resources
+
+def _cellwise(pp):
+    "Whether `pp` is a `Preprocessor` that only changes one cell at a time."
+    return isinstance(pp, Preprocessor) and type(pp).preprocess is Preprocessor.preprocess and type(pp).__call__ is Preprocessor.__call__
+
+def fuse_preprocessors(exp):
+    "Replace each run of consecutive cell-wise preprocessors of `exp` by a `FusedPreprocessor`, and drop disabled ones."
+    pps, run = [], []
+    for p in exp._preprocessors + [None]:
+        if p is not None and not getattr(p, 'enabled', True): continue
+        if p is not None and _cellwise(p): run.append(p); continue
+        if run: pps.append(FusedPreprocessor(run) if len(run) > 1 else run[0])
+        if p is not None: pps.append(p)
+        run = []
+    exp._preprocessors = pps
+    return exp
+
+# Cell
+class _Timed:
+    "Call preprocessor `pp` and add its wall time to `resources['timings'][name]`."
+    def __init__(self, pp, name=None): self.pp,self.name = pp,name or type(pp).__name__
+
+    def __call__(self, nb, resources):
+        start,ncells = time.perf_counter(),len(nb.cells)
+        nb, resources = self.pp(nb, resources)
+        t = resources.setdefault('timings', {}).setdefault(self.name, {'time':0., 'calls':0, 'cells':0})
+        t['time'] += time.perf_counter()-start
+        t['calls'] += 1
+        t['cells'] += ncells
+        return nb, resources
+
+def named_preprocessors(exp):
+    "Pairs of each enabled preprocessor of `exp` and its class name, numbered if the class occurs more than once."
+    seen = {}
+    for p in exp._preprocessors:
+        if not getattr(p, 'enabled', True): continue
+        name = type(p.pp if isinstance(p, _Timed) else p).__name__
+        seen[name] = seen.get(name, 0) + 1
+        yield p, name if seen[name]==1 else f'{name}#{seen[name]}'
+
+def time_preprocessors(exp):
+    "Instrument the enabled preprocessors of `exp`, such that each conversion records their timings in `resources['timings']`."
+    timed = {id(p):_Timed(p, name) for p,name in named_preprocessors(exp) if not isinstance(p, _Timed)}
+    exp._preprocessors = [timed.get(id(p), p) for p in exp._preprocessors]
+    return exp
+
+# Cell
+class MdxExporter(MarkdownExporter):
+    "A `MarkdownExporter` that reads notebooks with `nbdoc.fileio.read_nb`, and only validates them if not `optimistic_validation`."
+    def from_file(self, file_stream, resources=None, **kw):
+        return self.from_notebook_node(_read_nb(file_stream, validate=not self.optimistic_validation), resources=resources, **kw)
+
+# Cell
+def get_mdx_exporter(template_file='ob.tpl', profile=False, fuse=True, validate=False, cache_dir=None):
+    """A mdx notebook exporter which composes many pre-processors together, see `time_preprocessors` for `profile` and `fuse_preprocessors` for `fuse`.
+    Notebooks are only checked against the nbformat schema after the last preprocessor, unless `validate`, see `MdxExporter`.  `Black` keeps formatted code in the build cache `cache_dir`."""
     c = Config()
     c.TagRemovePreprocessor.remove_cell_tags = ("remove_cell", "hide")
     c.TagRemovePreprocessor.remove_all_outputs_tags = ("remove_output", "remove_outputs", "hide_output", "hide_outputs")
     c.TagRemovePreprocessor.remove_input_tags = ('remove_input', 'remove_inputs', "hide_input", "hide_inputs")
-    pp = [InjectMeta, WriteTitle, CleanMagics, BashIdentify, MetaflowTruncate,
+    pp = [ImageSave, InjectMeta, OutputBudget, WriteTitle, CleanMagics, BashIdentify, MetaflowTruncate,
           MetaflowSelectSteps, UpdateTags, InsertWarning, TagRemovePreprocessor, CleanFlags, CleanShowDoc, RmEmptyCode,
-          StripAnsi, Limit, HideInputLines, FilterOutput, Black, ImageSave, ImagePath, HTMLEscape]
+          StripAnsi, Limit, HideInputLines, FilterOutput, SelectedOutputBudget, Black, ImagePath, HTMLEscape]
+    cfg = get_config()
+    c.OutputBudget.max_bytes = int(cfg.get('output_max_bytes', 0)) # also the budget of `SelectedOutputBudget`
+    c.OutputBudget.max_lines = int(cfg.get('output_max_lines', 0))
+    c.ImageSave.asset_dir = cfg.get('asset_dir', '')
+    if cache_dir: c.Black.cache_dir = str(cache_dir)
+    c.ExtractOutputPreprocessor.enabled = False # `ImageSave` extracts images first instead, so they are named as before
     c.MarkdownExporter.preprocessors = pp
+    c.MarkdownExporter.optimistic_validation = not validate
     tmp_dir = Path(__file__).parent/'templates/'
     tmp_file = tmp_dir/f"{template_file}"
     if not tmp_file.exists(): raise ValueError(f"{tmp_file} does not exist in {tmp_dir}")
     c.MarkdownExporter.template_file = str(tmp_file)
-    return MarkdownExporter(config=c)
\ No newline at end of file
+    exp = MdxExporter(config=c)
+    if profile: return time_preprocessors(exp) # time each preprocessor on its own
+    return fuse_preprocessors(exp) if fuse else exp
\ No newline at end of file
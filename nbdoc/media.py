@@ -1,11 +1,19 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/media.ipynb (unless otherwise specified).
 
-__all__ = ['HTMLdf', 'HTMLEscape', 'ImageSave', 'ImagePath']
+__all__ = ['HTMLdf', 'is_dataframe', 'HTMLEscape', 'b64_chunks', 'ImageSave', 'ImagePath']
 
 # Cell
-from nbconvert.preprocessors import Preprocessor
+from nbconvert.preprocessors import Preprocessor, ExtractOutputPreprocessor
+from nbconvert.preprocessors.extractoutput import guess_extension_without_jpe, platform_utf_8_encode
 from fastcore.xtras import Path
+from .fileio import write_chunks
+from .assets import save_asset_chunks
+from nbdev.imports import get_config
+from traitlets import Unicode, Integer
 from html.parser import HTMLParser
+from binascii import a2b_base64
+from textwrap import dedent
+import hashlib, json, re, os
 
 # Cell
 class HTMLdf(HTMLParser):
@@ -31,11 +39,26 @@ class HTMLdf(HTMLParser):
         parser.feed(x)
         return parser.df
 
+# Cell
+_re_pandas_style = re.compile(r'\s*(?:<div[^<>]*>\s*)?<style\s+scoped\s*>[^<]*?\.dataframe')
+_parsed = {} # the sha1 digest of HTML -> `HTMLdf.search` of the HTML
+
+def is_dataframe(html, prefix=2048):
+    "Whether `html` has a scoped style for `.dataframe`, which pandas writes for a `DataFrame`, looking at the first `prefix` characters of `html` before parsing all of it."
+    if '.dataframe' not in html: return False # e.g. plots, which are the largest HTML outputs
+    if _re_pandas_style.match(html, 0, prefix): return True
+    key = hashlib.sha1(html.encode()).digest()
+    if key not in _parsed:
+        if len(_parsed) >= 1024: _parsed.clear()
+        _parsed[key] = HTMLdf.search(html)
+    return _parsed[key]
+
 # Cell
 class HTMLEscape(Preprocessor):
     """
     Place HTML in a codeblock and surround it with a <HTMLOutputBlock> component.
     """
+    cell_types,needs = ('code',),('outputs',)
     def preprocess_cell(self, cell, resources, index):
         if cell.cell_type =='code':
             outputs = []
@@ -43,29 +66,81 @@ class HTMLEscape(Preprocessor):
                 if o.get('data') and o['data'].get('text/html'):
                     cell.metadata.html_output = True
                     html = o['data']['text/html']
-                    cell.metadata.html_center = False if HTMLdf.search(html) else True
+                    cell.metadata.html_center = not is_dataframe(html)
                     o['data']['text/html'] = '```html\n'+html.strip()+'\n```'
         return cell, resources
 
 # Cell
-class ImageSave(Preprocessor):
-    "Saves images stored as bytes in notebooks to disk."
-    def preprocess(self, nb, resources):
-        meta = resources.get('metadata', {})
-        nb_name = meta.get('name')
-        nb_path = meta.get('path')
-        outfiles = resources.get('outputs')
-        if nb_name and outfiles:
-            resources['fmap'] = {}
-            for k,v in outfiles.items():
-                dest = Path(nb_path)/f'_{nb_name}_files/{k}'
-                dest.parent.mkdir(exist_ok=True)
-                dest.write_bytes(v)
-                resources['fmap'][f'{k}'] = f'_{nb_name}_files/{k}'
-        return nb, resources
+_b64_types = {'image/png', 'image/jpeg', 'application/pdf'}
+
+def b64_chunks(s, size=1<<20):
+    "Decode the base64 string `s`, which can contain newlines, `size` characters at a time."
+    rest = ''
+    for i in range(0, len(s), size):
+        part = rest + ''.join(s[i:i+size].split())
+        n = len(part) - len(part)%4
+        if n: yield a2b_base64(part[:n])
+        rest = part[n:]
+    if rest: yield a2b_base64(rest)
+
+def _output_chunks(data, mime_type, size=1<<20):
+    "The bytes of `data`, an output of type `mime_type`, encoded like `ExtractOutputPreprocessor` does, in chunks."
+    if mime_type in _b64_types: return b64_chunks(data, size)
+    if mime_type == 'application/json' or not isinstance(data, str):
+        if isinstance(data, bytes): data = data.decode('utf-8')
+        data = json.dumps(data)
+    return [platform_utf_8_encode(data)]
+
+# Cell
+class ImageSave(ExtractOutputPreprocessor):
+    """Extracts images from notebooks and saves them to disk, next to the notebook or in the asset store `asset_dir`.
+    Each image is decoded and written a chunk at a time, and `resources['outputs']` keeps the path and sha256 digest of each file instead of its content."""
+    asset_dir = Unicode('', help="The asset store, relative to settings.ini, see `nbdoc.assets`. Images are saved next to each notebook if empty.").tag(config=True)
+    chunk_size = Integer(1<<20, help="The number of base64 characters that are decoded at a time.").tag(config=True)
+    cell_types,needs = ('code',),('outputs',)
+
+    def _fname(self, out, mime_type, resources, cell_index, index):
+        "The name `ExtractOutputPreprocessor` gives output `out` of type `mime_type`."
+        ext = guess_extension_without_jpe(mime_type) or '.' + mime_type.rsplit('/')[-1]
+        fname = os.path.basename(out.metadata.get('filename', ''))
+        if fname and not fname.endswith(ext): fname += ext
+        fname = fname or self.output_filename_template.format(unique_key=resources.get('unique_key', 'output'), cell_index=cell_index,
+                                                              index=index, extension=ext)
+        files_dir = resources.get('output_files_dir')
+        return os.path.join(files_dir, fname) if files_dir else fname
+
+    def _save(self, fname, chunks, resources):
+        "Write `chunks` to where output `fname` is saved, and return its path and digest, and the path the markdown refers to."
+        meta = resources['metadata']
+        nb_name, nb_path = meta.get('name'), meta.get('path') or '.'
+        if self.asset_dir:
+            dest, digest = save_asset_chunks(get_config().config_path/self.asset_dir, fname, chunks)
+            return dest, digest, Path(os.path.relpath(dest, nb_path)).as_posix()
+        dest = Path(nb_path)/f'_{nb_name}_files/{fname}'
+        dest.parent.mkdir(parents=True, exist_ok=True) # other workers may create it at the same time
+        return (*write_chunks(dest, chunks), f'_{nb_name}_files/{fname}')
+
+    def preprocess_cell(self, cell, resources, cell_index):
+        if not resources.get('metadata', {}).get('name'): return super().preprocess_cell(cell, resources, cell_index) # nowhere to save to
+        if not isinstance(resources.get('outputs'), dict): resources['outputs'] = {}
+        outfiles = resources['outputs']
+        for index,out in enumerate(cell.get('outputs', [])):
+            if out.output_type not in ('display_data', 'execute_result'): continue
+            if 'text/html' in out.data: out.data['text/html'] = dedent(out.data['text/html'])
+            for mime_type in self.extract_output_types:
+                if mime_type not in out.data: continue
+                fname = self._fname(out, mime_type, resources, cell_index, index)
+                if isinstance(outfiles.get(fname), dict): # saved by this preprocessor, not by `ExtractOutputPreprocessor`
+                    raise ValueError(f"More than one output is saved to {fname}, in cell {cell_index}. Filenames must be unique across the notebook.")
+                chunks = _output_chunks(out.data[mime_type], mime_type, self.chunk_size)
+                dest, digest, resources.setdefault('fmap', {})[fname] = self._save(fname, chunks, resources)
+                out.metadata.setdefault('filenames', {})[mime_type] = fname
+                outfiles[fname] = {'path': str(dest), 'sha256': digest}
+        return cell, resources
 
 class ImagePath(Preprocessor):
-    "Changes the image path to the location where `ImageSave` saved the files."
+    "Changes the image path to the location where `ImageSave` saved the files, which can be in the asset store."
+    needs = ('outputs',)
     def preprocess_cell(self, cell, resources, index):
         fmap = resources.get('fmap')
         if fmap:
@@ -0,0 +1,61 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/report.ipynb (unless otherwise specified).
+
+__all__ = ['NbResult', 'summary', 'results_json', 'results_junit', 'write_reports']
+
+# Cell
+import json, traceback
+from fastcore.all import Path, store_attr
+
+# Cell
+class NbResult:
+    "The result of converting (`kind='build'`) or running (`kind='update'`) the notebook `fname`."
+    def __init__(self, fname, kind='build', status='passed', duration=0., error=None, traceback=None,
+                 output_bytes=0, assets=0, timings=None):
+        "`status` is 'passed', 'failed' or 'cached' for notebooks that didn't need converting or running."
+        store_attr()
+
+    @classmethod
+    def failed(cls, fname, kind, e, duration=0.):
+        "A failed result for the exception `e`, to be called in the `except` block that caught it."
+        return cls(fname, kind, 'failed', duration, error=f'{type(e).__name__}: {e}', traceback=traceback.format_exc())
+
+    def __bool__(self): return self.status != 'failed'
+    def __repr__(self): return f'{self.__class__.__name__}({str(self.fname)!r}, {self.status!r}, {self.duration:.2f}s)'
+    def to_dict(self):
+        keys = 'kind', 'status', 'duration', 'error', 'traceback', 'output_bytes', 'assets', 'timings'
+        return {'fname': str(self.fname), **{k:getattr(self, k) for k in keys}}
+
+# Cell
+def summary(results):
+    "The number of notebooks with each status in `results`, and the total time spent on them."
+    res = {s:sum(r.status == s for r in results) for s in ('passed', 'failed', 'cached')}
+    return {'notebooks': len(results), **res, 'duration': round(sum(r.duration for r in results), 3)}
+
+def results_json(results):
+    "`results` and their `summary` as JSON."
+    return json.dumps({'summary': summary(results), 'notebooks': [r.to_dict() for r in results]}, indent=2)
+
+# Cell
+def results_junit(results, name='nbdoc'):
+    "`results` as a JUnit XML test suite called `name`."
+    import xml.etree.ElementTree as ET
+    s = summary(results)
+    root = ET.Element('testsuites')
+    suite = ET.SubElement(root, 'testsuite', name=name, tests=str(s['notebooks']), failures=str(s['failed']),
+                          errors='0', skipped=str(s['cached']), time=f"{s['duration']:.3f}")
+    for r in results:
+        case = ET.SubElement(suite, 'testcase', classname=name, name=str(r.fname), time=f'{r.duration:.3f}')
+        if r.status == 'failed': ET.SubElement(case, 'failure', message=r.error or '').text = r.traceback
+        elif r.status == 'cached': ET.SubElement(case, 'skipped', message='restored from the build cache')
+        props = ET.SubElement(case, 'properties')
+        for k in ('output_bytes', 'assets'): ET.SubElement(props, 'property', name=k, value=str(getattr(r, k)))
+    return ET.tostring(root, encoding='unicode')
+
+# Cell
+def write_reports(results, name, report=None, junit=None):
+    "Write `results` as JSON to `report` and as JUnit XML to `junit`, for the ones that are given."
+    for fname,f in ((report, results_json), (junit, lambda o: results_junit(o, name))):
+        if not fname: continue
+        Path(fname).parent.mkdir(parents=True, exist_ok=True)
+        Path(fname).write_text(f(results))
+        print(f"wrote results to {fname}")
\ No newline at end of file
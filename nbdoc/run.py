@@ -1,18 +1,21 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/run.ipynb (unless otherwise specified).
 
-__all__ = ['nbrun', 'nbupdate', 'parallel_nbupdate', 'nbdoc_update']
+__all__ = ['KernelPool', 'kernel_pool', 'nbrun', 'nbupdate', 'async_nbrun', 'async_nbupdate', 'async_parallel_nbupdate',
+           'parallel_nbupdate', 'nbdoc_update']
 
 # Cell
+import json, time, functools, threading, asyncio
 from os import sys
-import nbformat
-import jupyter_client
-from nbformat.notebooknode import NotebookNode
-from nbclient.exceptions import CellExecutionError
-from nbdev.test import NoExportPreprocessor
-from nbdev.export import nbglob
+from .watch import nbglob
+from .fileio import atomic_write, write_if_changed, read_nb
+from .cache import RunCache, default_cache_dir
+from .shard import Durations, shard_files, save_shard, schedule
+from .report import NbResult, write_reports
+from .workers import recycling_map
 from typing import Union
+from nbdev.imports import get_config
 from fastcore.parallel import parallel
-from fastcore.script import call_parse
+from fastcore.script import call_parse, store_true, bool_arg
 from fastcore.foundation import L
 from fastcore.xtras import Path
 
@@ -26,51 +29,258 @@ def _gen_nb():
     return newP
 
 # Cell
+@functools.lru_cache(maxsize=None)
+def _kernel_names():
+    "The names of the installed kernelspecs, which are only looked up once per process."
+    import jupyter_client
+    return set(jupyter_client.kernelspec.KernelSpecManager().find_kernel_specs())
+
 def _get_kernel(nb):
     "Sees if kernelname exists otherwise uses the default of `python3`"
     nb_ks = nb.metadata.kernelspec.name
-    K = jupyter_client.kernelspec.KernelSpecManager()
-    ks = K.find_kernel_specs()
-    return nb_ks if nb_ks in ks else 'python3'
+    return nb_ks if nb_ks in _kernel_names() else 'python3'
+
+# Cell
+def _reserve_ports(n=5, ttl=60):
+    "Pick `n` free ports that no other process picked with `_reserve_ports` in the last `ttl` seconds, or `None` if ports can't be reserved."
+    import os, socket, tempfile
+    try: import fcntl
+    except ImportError: return None # not on Windows
+    reg = Path(tempfile.gettempdir())/f'nbdoc_ports_{os.getuid()}.json' # other users can't write to ours
+    try: lock = open(reg.with_suffix('.lock'), 'w')
+    except OSError: return None
+    with lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        now = time.time()
+        try: taken = {int(p):t for p,t in json.loads(reg.read_text()).items() if now-t < ttl}
+        except (OSError, ValueError): taken = {}
+        ports, socks = [], []
+        while len(ports) < n:
+            s = socket.socket()
+            s.bind(('127.0.0.1', 0)) # keep it open, so that the OS doesn't return it again
+            socks.append(s)
+            if s.getsockname()[1] not in taken: ports.append(s.getsockname()[1])
+        for s in socks: s.close()
+        taken.update({p:now for p in ports})
+        atomic_write(reg, json.dumps(taken).encode())
+    return ports
+
+@functools.lru_cache(maxsize=None)
+def _kernel_manager_class(sync=False):
+    "A kernel manager class whose kernels use ports from `_reserve_ports`, created on first use to keep imports light."
+    from jupyter_client import AsyncKernelManager, KernelManager
+    class ReservedPortsKernelManager(KernelManager if sync else AsyncKernelManager): # `KernelPool` starts kernels in threads, without an event loop
+        def __init__(self, **kwargs):
+            super().__init__(cache_ports=False, **kwargs) # Jupyter's port cache only knows about this process
+            ports = _reserve_ports(5)
+            if ports: self.shell_port, self.iopub_port, self.stdin_port, self.control_port, self.hb_port = ports # otherwise Jupyter picks them
+    return ReservedPortsKernelManager
+
+# Cell
+class KernelPool:
+    "Kernels that are started ahead of time, `size` per kernelspec, and replaced by a new kernel in the background after each notebook."
+    def __init__(self, size=2, warmup=None, timeout=60):
+        from multiprocessing.util import Finalize
+        self.size,self.warmup,self.timeout = size,warmup,timeout
+        self.ready,self.kms,self.threads,self.lock = {},set(),[],threading.Lock()
+        Finalize(self, KernelPool.shutdown, args=(self,), exitpriority=10) # also runs when a worker process of a pool exits
+
+    def _execute(self, km, code):
+        "Run `code` silently in the kernel of `km`, once it is ready."
+        kc = km.blocking_client()
+        kc.start_channels()
+        try:
+            kc.wait_for_ready(timeout=self.timeout)
+            if not code: return
+            r = kc.execute_interactive(code, silent=True, timeout=self.timeout, output_hook=lambda msg: None)
+            if r['content']['status'] != 'ok': print(f"warmup failed: {r['content'].get('ename')}: {r['content'].get('evalue')}")
+        finally: kc.stop_channels()
+
+    def _start(self, name, old=None):
+        "Shut down the kernel of `old`, then start a new kernel `name`, warm it up and make it ready."
+        if old is not None: self._stop(old)
+        km = None
+        try:
+            km = _kernel_manager_class(sync=True)(kernel_name=name, client_class='jupyter_client.asynchronous.AsyncKernelClient')
+            with self.lock: self.kms.add(km)
+            km.start_kernel()
+            self._execute(km, self.warmup and f'exec({self.warmup!r}, {{}})')
+        except Exception as e:
+            print(f'kernel {name} failed to start: {e}')
+            if km is not None: self._stop(km)
+            km = None # `get` starts another one, and the notebook starts a kernel of its own
+        self.ready[name].put(km)
+
+    def _stop(self, km):
+        "Shut down the kernel of `km`."
+        with self.lock: self.kms.discard(km)
+        try: km.shutdown_kernel(now=True)
+        except Exception: pass
+
+    def _spawn(self, name, old=None):
+        t = threading.Thread(target=self._start, args=(name, old), daemon=True)
+        with self.lock: self.threads = [o for o in self.threads if o.is_alive()] + [t]
+        t.start()
+
+    def get(self, name, path='.'):
+        "A warm kernel manager of kernelspec `name` whose working directory is `path`, or None if its kernel failed to start."
+        import queue
+        with self.lock: new = name not in self.ready
+        if new:
+            self.ready[name] = queue.Queue()
+            for _ in range(self.size): self._spawn(name)
+        km = self.ready[name].get()
+        if km is None: self._spawn(name)
+        else: self._execute(km, f"__import__('os').chdir({str(Path(path).absolute())!r})")
+        return km
+
+    def put(self, name, km):
+        "Give back `km`, which is then replaced by a new kernel of `name` in the background."
+        self._spawn(name, km)
+
+    def shutdown(self):
+        "Shut down all the kernels of the pool, waiting for those that are being started."
+        for t in list(self.threads): t.join()
+        for km in list(self.kms): self._stop(km)
+
+@functools.lru_cache(maxsize=None)
+def kernel_pool(size=2, warmup=None):
+    "The `KernelPool` of this process with `size` kernels per kernelspec warmed up with `warmup`, created on first use."
+    return KernelPool(size, warmup)
 
 # Cell
-def nbrun(fname:Union[str, Path], flags=None) -> NotebookNode:
-    "Execute notebook and skip cells that have flags consistent `tst_flags` in settings.ini"
+def _read(fname, validate=False):
+    "Read the notebook `fname`, and return its path, the notebook and the kernel to run it with."
     file = Path(fname)
     assert file.name.endswith('.ipynb'), f'{str(fname)} is not a notebook.'
     assert file.is_file(), f'file {str(fname)} not found.'
-    nb = nbformat.read(file, as_version=4)
-    if flags is None: flags = []
+    nb = read_nb(file, validate)
     kernel = _get_kernel(nb)
     print(f"running: {str(file)} with kernel: {kernel}")
-    exp = NoExportPreprocessor(flags=flags, timeout=1500, kernel_name=kernel)
-    pnb,_ = exp.preprocess(nb, resources={'metadata': {'path': file.parent}})
+    return file, nb, kernel
+
+def _km_kwargs():
+    "The kernel manager class of kernels that are started for a notebook."
+    # `fcntl` is not available on Windows, where notebooks are run one at a time anyway
+    return {} if sys.platform == "win32" else {'kernel_manager_class': _kernel_manager_class()}
+
+def nbrun(fname:Union[str, Path], flags=None, validate=False, pool:KernelPool=None) -> 'NotebookNode':
+    "Execute notebook and skip cells that have flags consistent `tst_flags` in settings.ini, in a kernel of `pool` if given"
+    from nbdev.test import NoExportPreprocessor # the Jupyter stack is only imported when notebooks are run
+    file, nb, kernel = _read(fname, validate)
+    if flags is None: flags = []
+    exp = NoExportPreprocessor(flags=flags, timeout=1500, kernel_name=kernel, **_km_kwargs())
+    km = pool.get(kernel, file.parent) if pool else None
+    try: pnb,_ = exp.preprocess(nb, resources={'metadata': {'path': file.parent}}, km=km)
+    finally:
+        if km is not None:
+            if exp.kc is not None: exp.kc.stop_channels() # it is only cleaned up along with kernels that `exp` started
+            pool.put(kernel, km)
     return pnb
 
 # Cell
-def nbupdate(fname:Union[str, Path], flags=None):
-    "Run notebooks and update them in place."
-    try:
-        nb = nbrun(fname, flags=flags)
-    except CellExecutionError as e:
+def _save(fname, nb):
+    "Write the notebook `nb` to `fname`, unless it didn't change, and return its size in bytes."
+    import nbformat
+    out = (nbformat.writes(nb) + '\n').encode() # like `nbformat.write` and Jupyter
+    write_if_changed(fname, out) # atomically, so an interrupted run doesn't leave a truncated notebook
+    return len(out)
+
+def nbupdate(fname:Union[str, Path], flags=None, validate=False, pool=0, warmup=None):
+    "Run notebooks and update them in place, in a kernel of `kernel_pool(pool, warmup)` if `pool`, and return a `NbResult`."
+    start = time.perf_counter()
+    try: size = _save(fname, nbrun(fname, flags=flags, validate=validate, pool=kernel_pool(pool, warmup) if pool else None))
+    except Exception as e:
         print(f'Error in {str(fname)}:\n{e}')
-        return False
+        return NbResult.failed(Path(fname), 'update', e, time.perf_counter()-start)
     print(f"finished: {str(fname)}")
-    nbformat.write(nb, fname)
-    return True
+    return NbResult(Path(fname), 'update', duration=time.perf_counter()-start, output_bytes=size)
+
+# Cell
+@functools.lru_cache(maxsize=None)
+def _async_client_class():
+    "A `NotebookClient` that skips the same cells as `nbdev.test.NoExportPreprocessor`, created on first use to keep imports light."
+    from nbclient import NotebookClient
+    from nbdev.test import get_cell_flags, _re_notebook2script
+    from nbdev.export import check_re
+    class NoExportClient(NotebookClient):
+        def __init__(self, nb, flags, **kwargs):
+            self.flags = flags
+            super().__init__(nb, **kwargs)
+
+        async def async_execute_cell(self, cell, cell_index, **kwargs):
+            if cell.cell_type != 'code' or any(f not in self.flags for f in get_cell_flags(cell)) or check_re(cell, _re_notebook2script): return cell
+            return await super().async_execute_cell(cell, cell_index, **kwargs)
+    return NoExportClient
+
+async def async_nbrun(fname:Union[str, Path], flags=None, validate=False) -> 'NotebookNode':
+    "Execute notebook like `nbrun`, without blocking the event loop while its cells run."
+    file, nb, kernel = _read(fname, validate)
+    client = _async_client_class()(nb, flags or [], timeout=1500, kernel_name=kernel, resources={'metadata': {'path': file.parent}}, **_km_kwargs())
+    return await client.async_execute()
+
+async def async_nbupdate(fname:Union[str, Path], flags=None, validate=False):
+    "Run notebooks and update them in place like `nbupdate`, without blocking the event loop while its cells run."
+    start = time.perf_counter()
+    try: size = _save(fname, await async_nbrun(fname, flags=flags, validate=validate))
+    except Exception as e:
+        print(f'Error in {str(fname)}:\n{e}')
+        return NbResult.failed(Path(fname), 'update', e, time.perf_counter()-start)
+    print(f"finished: {str(fname)}")
+    return NbResult(Path(fname), 'update', duration=time.perf_counter()-start, output_bytes=size)
+
+async def async_parallel_nbupdate(files, concurrency=8, flags=None, validate=False):
+    "Run and update `files` with `async_nbupdate`, at most `concurrency` at a time and in the order of `files`, and return their `NbResult`s."
+    sem = asyncio.Semaphore(concurrency)
+    async def _update(f):
+        async with sem: return await async_nbupdate(f, flags=flags, validate=validate)
+    return L(await asyncio.gather(*map(_update, files)))
 
 # Cell
-def parallel_nbupdate(basedir:Union[Path,str], flags=None, recursive=True, n_workers=None, pause=0.1):
-    "Run all notebooks in `dir` and save them in place."
+def parallel_nbupdate(basedir:Union[Path,str], flags=None, recursive=True, n_workers=None, pause=0, shard=None, durations=None, report=None, junit=None, validate=False, max_tasks=None, max_rss=None, pool=None, warmup=None, concurrency=None, force_all=False, cache_dir=None):
+    """Run all notebooks in `dir` and save them in place, and return their `NbResult`s.
+    Unless `force_all`, notebooks whose code, flags, kernel and dependencies didn't change since they last ran get their outputs from the `RunCache` in `cache_dir` instead.
+    With `concurrency`, up to that many notebooks run at once in this process with asyncio, see `async_parallel_nbupdate`, instead of in `n_workers` processes.
+    Workers are restarted after `max_tasks` notebooks, or when they and their kernels use more than `max_rss` MB, see `nbdoc.workers.recycling_map`.
+    Each worker keeps `pool` kernels per kernelspec ready, warmed up with `warmup`, which default to `kernel_pool` and `kernel_warmup` in settings.ini, see `KernelPool`."""
+    cfg = get_config()
+    if pool is None: pool = int(cfg.get('kernel_pool', 0))
+    if warmup is None: warmup = cfg.get('kernel_warmup')
+    kw = dict(flags=flags, validate=validate, pool=pool, warmup=warmup)
     files = L(nbglob(basedir, recursive=recursive)).filter(lambda x: not x.name.startswith('Untitled'))
     if len(files)==1:
+        force_all = True
         if n_workers is None: n_workers=0
+    durs = Durations(durations or Path(cache_dir or default_cache_dir())/'durations.json')
+    if shard: files = shard_files(files, shard, 'update', durs)
+    cache, keys = RunCache(Path(cache_dir)/'run' if cache_dir else None), {}
+    nbs, files = files, []
+    for fname in nbs:
+        nb = read_nb(fname)
+        keys[fname] = cache.key(fname, nb, flags, _get_kernel(nb))
+        if not force_all and cache.restore(nb, keys[fname]):
+            _save(fname, nb) # the markdown cells may have changed since it ran
+            print(f"restored from cache: {str(fname)}")
+        else: files.append(fname)
+    cached = L(NbResult(f, 'update', 'cached') for f in nbs if f not in files)
     if sys.platform == "win32": n_workers = 0
-    passed = parallel(nbupdate, files, flags=flags, n_workers=n_workers, pause=pause)
-    if all(passed): print("All notebooks refreshed!")
+    files = schedule(files, 'update', durs, n_workers) # start the longest notebooks first
+    if concurrency:
+        from nbclient.util import run_sync # runs the event loop in a thread if one is already running, as in a notebook
+        res = run_sync(async_parallel_nbupdate)(files, concurrency, flags=flags, validate=validate)
+    elif max_tasks or max_rss:
+        res = recycling_map(nbupdate, files, n_workers, max_tasks, max_rss, on_fail=lambda f,e: NbResult.failed(f, 'update', e), **kw)
+    else: res = parallel(nbupdate, files, n_workers=n_workers, pause=pause, **kw)
+    durs.update('update', {r.fname:r.duration for r in res if r}).save()
+    for r in res:
+        if r: cache.store(read_nb(r.fname), keys[r.fname])
+    res = cached + res
+    write_reports(res, 'nbdoc_update', report, junit)
+    if all(res): print("All notebooks refreshed!")
     else:
         msg = "Notebook Run & Update failed on the following:\n"
-        raise Exception(msg + '\n'.join([f.name for p,f in zip(passed,files) if not p]))
+        raise Exception(msg + '\n'.join([r.fname.name for r in res if not r]))
+    return res
 
 # Cell
 @call_parse
@@ -78,11 +288,39 @@ def nbdoc_update(
     srcdir:str=None,  # A directory of notebooks to refresh recursively, can also be a filename.
     flags:str=None,  # Space separated list of flags (tst_flags in settings.ini) to NOT ignore while running notebooks.  Otherwise, those cells are ignored.
     n_workers:int=None,  # Number of workers to use
-    pause:float=0.5  # Pause time (in secs) between notebooks to avoid race conditions
+    pause:float=0,  # Pause time (in secs) between starting notebooks
+    max_tasks:int=None,  # Restart each worker process after running this many notebooks
+    max_rss:int=None,  # Restart a worker whose memory, with its kernel, goes over this many MB, and run its notebook again in a new process
+    pool:int=None,  # Keep this many kernels per kernelspec started in each worker, defaults to `kernel_pool` in settings.ini, 0 starts a kernel for each notebook
+    warmup:str=None,  # Code, such as imports, to run in each kernel of the pool before it is handed to a notebook, defaults to `kernel_warmup` in settings.ini
+    concurrency:int=None,  # Run up to this many notebooks at once from this process with asyncio, instead of in worker processes
+    force_all:bool_arg=False,  # Run even notebooks whose code, flags, kernel and dependencies haven't changed since they last ran
+    cache_dir:str=None,  # Directory of the cache of outputs, defaults to `cache_dir` in settings.ini or `.nbdoc_cache`
+    durations:str=None,  # JSON file of the durations of notebooks that shards are split by, defaults to `durations.json` in the build cache
+    shard:str=None,  # Only run part `i` of `N`, written as `i/N`, and save the notebooks for `nbdoc_merge`
+    shard_dir:str=None,  # Where to save the notebooks of the shard, defaults to `shards` in the build cache
+    report:str=None,  # Write the result of each notebook to this JSON file
+    junit:str=None,  # Write the result of each notebook to this JUnit XML file
+    validate:store_true=False  # Check notebooks against the nbformat schema before running them
 ):
     "Refresh all notebooks in `srcdir` by running them and saving them in place."
-    parallel_nbupdate(basedir=srcdir,
-                      flags=flags,
-                      recursive=True,
-                      n_workers=n_workers,
-                      pause=pause)
\ No newline at end of file
+    res = parallel_nbupdate(basedir=srcdir,
+                            flags=flags,
+                            recursive=True,
+                            n_workers=n_workers,
+                            pause=pause,
+                            max_tasks=max_tasks,
+                            max_rss=max_rss,
+                            pool=pool,
+                            warmup=warmup,
+                            concurrency=concurrency,
+                            force_all=force_all,
+                            cache_dir=cache_dir,
+                            durations=durations,
+                            shard=shard,
+                            report=report,
+                            junit=junit,
+                            validate=validate)
+    if shard:
+        durs = Durations(durations or Path(cache_dir or default_cache_dir())/'durations.json')
+        save_shard(shard, 'update', res.attrgot('fname'), res.attrgot('fname'), durs, shard_dir)
\ No newline at end of file
@@ -0,0 +1,159 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/shard.ipynb (unless otherwise specified).
+
+__all__ = ['parse_shard', 'Durations', 'estimate_durations', 'partition', 'shard_files', 'makespan', 'schedule',
+           'build_outputs', 'save_shard', 'merge_shards', 'nbdoc_merge']
+
+# Cell
+import json, shutil
+from nbdev.imports import get_config
+from fastcore.all import Path, L, call_parse, merge, defaults
+from .cache import default_cache_dir, _outputs, _rel
+from .fileio import write_if_changed
+from .assets import asset_refs
+from .docindex import index_md
+from .watch import nbglob
+
+# Cell
+def parse_shard(shard):
+    "Parse `shard`, written as `i/N`, into the shard `i` counting from 1 and the number of shards `N`."
+    try: i,n = (int(o) for o in str(shard).split('/'))
+    except ValueError: raise ValueError(f"shard must look like i/N, for example 1/4, but got {shard!r}") from None
+    if not 1 <= i <= n: raise ValueError(f"shard {i}/{n} is not between 1/{n} and {n}/{n}")
+    return i,n
+
+# Cell
+class Durations:
+    "Durations in seconds of building (`kind='build'`) and running (`kind='update'`) each notebook, saved in `path`."
+    def __init__(self, path=None):
+        self.path = Path(path) if path else default_cache_dir()/'durations.json'
+        self.d = json.loads(self.path.read_text()) if self.path.exists() else {}
+
+    def get(self, fname, kind): return self.d.get(_rel(fname), {}).get(kind)
+
+    def update(self, kind, durations):
+        "Record `durations`, a dict from notebooks to seconds."
+        return self.merge(kind, {_rel(f):t for f,t in durations.items()})
+
+    def merge(self, kind, durations):
+        "Record `durations`, a dict from paths relative to settings.ini to seconds."
+        for k,t in durations.items(): self.d.setdefault(k, {})[kind] = round(t, 3)
+        return self
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_if_changed(self.path, json.dumps(self.d, indent=2, sort_keys=True))
+
+# Cell
+def estimate_durations(files, kind='build', durations=None):
+    "The recorded duration of each notebook in `files`, estimated from its size if there is none."
+    durations = durations or Durations()
+    known = {f:durations.get(f, kind) for f in files}
+    sizes = {f:Path(f).stat().st_size for f in files}
+    timed = [f for f,t in known.items() if t is not None]
+    rate = sum(known[f] for f in timed)/max(sum(sizes[f] for f in timed), 1) if timed else 1
+    return {f:known[f] if known[f] is not None else sizes[f]*rate for f in files}
+
+def partition(weights, n):
+    "Split the keys of `weights` into `n` parts with similar total weights, longest first."
+    parts, loads = [[] for _ in range(n)], [0.]*n
+    for f in sorted(weights, key=lambda f: (-weights[f], _rel(f))):
+        i = loads.index(min(loads))
+        parts[i].append(f)
+        loads[i] += weights[f]
+    return parts
+
+def shard_files(files, shard, kind='build', durations=None):
+    "The notebooks in `files` that belong to `shard`, written as `i/N`."
+    i,n = parse_shard(shard)
+    mine = set(partition(estimate_durations(files, kind, durations), n)[i-1])
+    return L(f for f in files if f in mine)
+
+# Cell
+def makespan(weights, n_workers):
+    "Predicted wall-clock time of running jobs with durations `weights` longest first on `n_workers` workers."
+    return max(sum(weights[f] for f in p) for p in partition(weights, max(n_workers, 1)))
+
+def _lower_bound(weights, n_workers): return max(max(weights.values()), sum(weights.values())/max(n_workers, 1))
+
+# Cell
+def schedule(files, kind='build', durations=None, n_workers=None):
+    "Sort `files` longest first, and print the predicted wall-clock time if any of their durations are recorded."
+    durations = durations or Durations()
+    est = estimate_durations(files, kind, durations)
+    files = L(sorted(files, key=lambda f: (-est[f], _rel(f))))
+    if files and any(durations.get(f, kind) is not None for f in files):
+        n = max(defaults.cpus if n_workers is None else n_workers, 1)
+        print(f"predicted time: {makespan(est, n):.1f}s for {len(files)} notebooks on {n} workers "
+              f"(at least {_lower_bound(est, n):.1f}s)")
+    return files
+
+# Cell
+def build_outputs(nbs):
+    "The markdown files and assets that `nbdoc_build` generates for the notebooks in `nbs`, including the files in the asset store they refer to."
+    res = []
+    for f in nbs:
+        md, assets = _outputs(f)
+        if md.exists(): res.append(md)
+        if assets.is_dir(): res += sorted(o for o in assets.rglob('*') if o.is_file())
+        res += [o for o in asset_refs(md) if o not in res] # notebooks can share assets
+    return res
+
+def save_shard(shard, kind, nbs, files, durations=None, dest=None, index_path=None):
+    "Save `files`, the outputs of the notebooks `nbs` of `shard`, in `dest` for `merge_shards`."
+    i,n = parse_shard(shard)
+    durations = durations or Durations()
+    dest = Path(dest or default_cache_dir()/'shards')/f'{kind}-{i}-of-{n}'
+    shutil.rmtree(dest, ignore_errors=True)
+    rels = [_rel(f) for f in files]
+    for f,rel in zip(files, rels):
+        if Path(rel).is_absolute(): raise ValueError(f"{f} is not in {get_config().config_path}")
+        (dest/'files'/rel).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(f, dest/'files'/rel)
+    mds = [f for f in files if Path(f).suffix == '.md']
+    man = {'shard': [i,n], 'kind': kind, 'files': rels, 'nbs': [_rel(f) for f in nbs],
+           'durations': {_rel(f):t for f in nbs if (t := durations.get(f, kind)) is not None},
+           'index': index_md(mds, index_path) if mds else {}}
+    (dest/'manifest.json').write_text(json.dumps(man, indent=2))
+    return dest
+
+# Cell
+def merge_shards(src=None, durations=None, basedir=None):
+    """Put the outputs of the shards saved in `src` in place, and merge their durations and `_nbdoc_index.json` fragments.
+    Warns about missing shards, and about notebooks in `basedir`, which defaults to `nbs_path` in settings.ini, that none of the shards of a kind ran."""
+    src = Path(src or default_cache_dir()/'shards')
+    root = get_config().config_path
+    durations = durations if isinstance(durations, Durations) else Durations(durations)
+    idx_file = root/'_nbdoc_index.json'
+    idx = json.loads(idx_file.read_text()) if idx_file.exists() else {}
+    mans, seen, covered = sorted(src.rglob('manifest.json')), {}, {}
+    for man_file in mans:
+        man = json.loads(man_file.read_text())
+        for rel in man['files']:
+            (root/rel).parent.mkdir(parents=True, exist_ok=True)
+            write_if_changed(root/rel, (man_file.parent/'files'/rel).read_bytes())
+        durations.merge(man['kind'], man['durations'])
+        idx = merge(idx, man['index'])
+        i,n = man['shard']
+        seen.setdefault((man['kind'], n), set()).add(i)
+        covered.setdefault(man['kind'], set()).update(man.get('nbs', []))
+    for (kind,n),got in seen.items():
+        missing = sorted(set(range(1, n+1)) - got)
+        if missing: print(f"Warning: missing {kind} shards {', '.join(f'{i}/{n}' for i in missing)}")
+    nbs = [_rel(f) for f in nbglob(basedir or get_config().path('nbs_path'), recursive=True) if not f.name.startswith('Untitled')]
+    for kind,got in covered.items():
+        missing = [f for f in nbs if f not in got] # for example when shards partitioned with different durations
+        if missing: print(f"Warning: no {kind} shard has {', '.join(missing)}")
+    if idx: write_if_changed(idx_file, json.dumps(idx, indent=4))
+    durations.save()
+    return mans
+
+# Cell
+@call_parse
+def nbdoc_merge(
+    srcdir:str=None,  # Directory with the outputs of shards, searched recursively, defaults to `shards` in the build cache
+    durations:str=None,  # JSON file of the durations of notebooks, defaults to `durations.json` in the build cache
+    nbs_dir:str=None  # The directory of notebooks that the shards should cover, defaults to `nbs_path` in settings.ini
+):
+    "Merge the outputs of `nbdoc_build --shard` or `nbdoc_update --shard` from several machines into this repo."
+    mans = merge_shards(srcdir, durations, nbs_dir)
+    print(f"merged {len(mans)} shards from {srcdir or default_cache_dir()/'shards'}")
\ No newline at end of file
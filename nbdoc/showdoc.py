@@ -96,7 +96,7 @@ def fmt_sig_param(p:inspect.Parameter):
     prefix = f'<SigArg name="{name}" '
 
     if p.annotation != inspect._empty:
-        prefix += f'type="{p.annotation.__name__}" '
+        prefix += f'type="{getattr(p.annotation, "__name__", p.annotation)}" '
     if p.default != inspect._empty:
         prefix += f'default="{p.default}" '
 
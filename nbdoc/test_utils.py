@@ -1,11 +1,12 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/test_utils.ipynb (unless otherwise specified).
 
-__all__ = ['run_preprocessor', 'show_plain_md']
+__all__ = ['run_preprocessor', 'show_plain_md', 'startup_time', 'heavy_imports']
 
 # Cell
 from nbconvert import MarkdownExporter
 from traitlets.config import Config
 from fastcore.xtras import Path
+import json, subprocess, sys, time
 
 # Cell
 def run_preprocessor(pp, nbfile, template_file='ob.tpl', display_results=False):
@@ -23,4 +24,21 @@ def run_preprocessor(pp, nbfile, template_file='ob.tpl', display_results=False):
 # Cell
 def show_plain_md(nbfile):
     md = MarkdownExporter()
-    print(md.from_filename(nbfile)[0])
\ No newline at end of file
+    print(md.from_filename(nbfile)[0])
+
+# Cell
+def startup_time(cmd, repeat=3):
+    "The fastest of `repeat` wall times of running `cmd` in a subprocess, in seconds."
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, check=True, capture_output=True)
+        times.append(time.perf_counter()-start)
+    return min(times)
+
+_heavy = ['nbconvert', 'nbformat', 'nbclient', 'jupyter_client', 'black', 'numpydoc', 'nbdev.export', 'nbdev.test']
+
+def heavy_imports(module):
+    "Which of nbconvert, black, numpydoc and the Jupyter stack are imported along with `module`."
+    code = f"import sys, json, {module}; print(json.dumps([m for m in {_heavy!r} if m in sys.modules]))"
+    return json.loads(subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout)
\ No newline at end of file
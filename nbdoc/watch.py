@@ -0,0 +1,121 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/watch.ipynb (unless otherwise specified).
+
+__all__ = ['nbglob', 'InotifyWatcher', 'PollWatcher', 'watch_nbs']
+
+# Cell
+import ctypes, ctypes.util, os, select, struct, sys, time
+from nbdev.imports import get_config
+from fastcore.foundation import L
+from fastcore.xtras import Path
+
+# Cell
+_IN_CLOSE_WRITE, _IN_MOVED_TO, _IN_CREATE, _IN_ISDIR = 0x8, 0x80, 0x100, 0x40000000
+
+def _skip_dir(name):
+    "Skip hidden folders, such as checkpoints, like `nbglob` does."
+    return name.startswith('.')
+
+def _walk_dirs(path):
+    "`path` and all of its subdirectories that are not skipped."
+    for root, dirs, _ in os.walk(path):
+        dirs[:] = [d for d in dirs if not _skip_dir(d)]
+        yield Path(root)
+
+def _skip_nb(f): return f.name.startswith(('_', 'Untitled'))
+
+# Cell
+def nbglob(fname=None, recursive=None, extension='.ipynb', config_key='nbs_path') -> L:
+    "Find all files in a directory matching an extension given a `config_key`, like `nbdev.export.nbglob` but without importing nbformat."
+    if recursive == None: recursive=get_config().get('recursive', 'False').lower() == 'true'
+    fname = Path(fname or get_config().path(config_key))
+    if fname.is_file(): return L([fname])
+    if fname.is_dir(): pat = f'**/*{extension}' if recursive else f'*{extension}'
+    else: fname,_,pat = str(fname).rpartition(os.path.sep)
+    if str(fname).endswith('**'): fname,pat = fname[:-2],'**/'+pat
+    fls = L(Path(fname).glob(pat)).map(Path)
+    return fls.filter(lambda x: x.name[0]!='_' and '/.' not in str(x))
+
+# Cell
+class InotifyWatcher:
+    "Report notebooks that were written in `path` or its subdirectories with Linux inotify."
+    def __init__(self, path):
+        if not sys.platform.startswith('linux'): raise OSError('inotify is only available on Linux.')
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init()
+        if self.fd < 0: raise OSError(ctypes.get_errno(), 'inotify_init failed.')
+        self.wds = {}
+        for d in _walk_dirs(path): self._add(d)
+
+    def _add(self, d):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(str(d)), _IN_CLOSE_WRITE|_IN_MOVED_TO|_IN_CREATE)
+        if wd >= 0: self.wds[wd] = Path(d)
+
+    def read(self, timeout):
+        "Notebooks that were written within `timeout` seconds."
+        changed = set()
+        if not select.select([self.fd], [], [], timeout)[0]: return changed
+        buf, i = os.read(self.fd, 1<<16), 0
+        while i < len(buf):
+            wd, mask, _, n = struct.unpack_from('iIII', buf, i)
+            name = buf[i+16:i+16+n].rstrip(b'\0').decode()
+            i += 16+n
+            if wd not in self.wds: continue
+            p = self.wds[wd]/name
+            if mask & _IN_ISDIR:
+                if not _skip_dir(name): self._add(p)
+            elif name.endswith('.ipynb') and mask & (_IN_CLOSE_WRITE|_IN_MOVED_TO): changed.add(p)
+        return changed
+
+    def close(self): os.close(self.fd)
+
+# Cell
+class PollWatcher:
+    "Report notebooks that were written in `path` or its subdirectories by comparing snapshots of their size and modified time."
+    def __init__(self, path):
+        self.path = path
+        self.snap = self._snapshot()
+
+    def _snapshot(self):
+        snap = {}
+        for d in _walk_dirs(self.path):
+            for f in d.glob('*.ipynb'):
+                try: st = f.stat()
+                except FileNotFoundError: continue
+                snap[f] = (st.st_mtime_ns, st.st_size)
+        return snap
+
+    def read(self, timeout):
+        "Notebooks that were written within `timeout` seconds."
+        time.sleep(timeout)
+        snap = self._snapshot()
+        changed = {f for f,s in snap.items() if self.snap.get(f) != s}
+        self.snap = snap
+        return changed
+
+    def close(self): pass
+
+# Cell
+def _get_watcher(path, poll=False):
+    "An `InotifyWatcher` where available, otherwise a `PollWatcher`."
+    if not poll:
+        try: return InotifyWatcher(path)
+        except (OSError, AttributeError): pass
+    return PollWatcher(path)
+
+def watch_nbs(path, interval=0.5, poll=False):
+    "Return a generator of sets of notebooks in `path` as they are saved, with inotify where available and polling otherwise."
+    return _watch(_get_watcher(path, poll=poll), interval)
+
+def _watch(w, interval):
+    try:
+        while True:
+            changed = w.read(interval)
+            if not changed: continue
+            # editors write several events per save, wait for them to settle
+            while True:
+                more = w.read(0.1)
+                if not more: break
+                changed |= more
+            changed = {f for f in changed if f.exists() and not _skip_nb(f)}
+            if changed: yield changed
+    finally: w.close()
\ No newline at end of file
@@ -0,0 +1,108 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/workers.ipynb (unless otherwise specified).
+
+__all__ = ['rss_mb', 'recycling_map']
+
+# Cell
+import os, sys, time, shutil, tempfile, threading
+import multiprocessing as mp
+from collections import Counter
+from concurrent.futures import wait
+from concurrent.futures.process import BrokenProcessPool
+from fastcore.all import Path, L, ProcessPoolExecutor, defaults
+
+# Cell
+def rss_mb():
+    "The resident memory of this process and its child processes, such as kernels, in MB."
+    try: import psutil # installed along with ipykernel
+    except ImportError: # only the peak of this process is known
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/(2**20 if sys.platform == 'darwin' else 2**10)
+    total, p = 0, psutil.Process()
+    for q in [p, *p.children(recursive=True)]:
+        try: total += q.memory_info().rss
+        except psutil.Error: pass # it exited in the meantime
+    return total/2**20
+
+def _kill_children():
+    "Kill the child processes of this process, so that its kernels don't outlive it."
+    try: import psutil
+    except ImportError: return
+    for q in psutil.Process().children(recursive=True):
+        try: q.kill()
+        except psutil.Error: pass
+
+# Cell
+_state, _current = None, None
+
+def _watch(max_rss, interval):
+    "Kill this worker and its children once they use more than `max_rss` MB, marking the task it was running."
+    while True:
+        time.sleep(interval)
+        if rss_mb() <= max_rss: continue
+        i = _current
+        if i is not None: (_state/f'{i}.over').touch()
+        _kill_children()
+        os._exit(1)
+
+def _init(state, max_rss, interval, initializer, initargs):
+    "Initialize a worker of a pool with the marker directory `state`."
+    global _state
+    _state = Path(state)
+    if max_rss: threading.Thread(target=_watch, args=(max_rss, interval), daemon=True).start()
+    if initializer: initializer(*initargs)
+
+def _run(f, i, item, kwargs):
+    "Call `f(item, **kwargs)`, the task `i`, after marking it as started."
+    global _current
+    (_state/f'{i}.started').touch()
+    _current = i
+    try: return f(item, **kwargs)
+    finally: _current = None
+
+# Cell
+_per_child = sys.version_info >= (3, 11) # `ProcessPoolExecutor` has `max_tasks_per_child`
+
+def _pool(n_workers, max_tasks, max_rss, interval, initializer, initargs):
+    "A new pool of `n_workers` processes and its marker directory."
+    state = tempfile.mkdtemp(prefix='nbdoc_pool_')
+    kw = {'max_tasks_per_child': max_tasks, 'mp_context': mp.get_context('spawn')} if max_tasks and _per_child else {}
+    return ProcessPoolExecutor(n_workers, initializer=_init, initargs=(state, max_rss, interval, initializer, initargs), **kw), Path(state)
+
+# Cell
+def recycling_map(f, items, n_workers=None, max_tasks=None, max_rss=None, on_fail=None, retries=1, initializer=None, initargs=(), interval=0.5, **kwargs):
+    """Call `f(item, **kwargs)` for each of `items` in `n_workers` processes and return the results, restarting each worker after `max_tasks` tasks.
+    A worker that uses more than `max_rss` MB, with its children, is killed and its task run again in a new process.  The result of a task whose worker died more than `retries` times is `on_fail(item, error)`, which raises the error if `on_fail` is None.
+    With `n_workers=0`, tasks run one after the other in this process, and are neither recycled nor checked for memory."""
+    items = list(items)
+    if n_workers == 0:
+        if initializer: initializer(*initargs)
+        return L(f(o, **kwargs) for o in items)
+    n_workers = n_workers or defaults.cpus
+    res, lost, todo = {}, Counter(), list(range(len(items)))
+    size = n_workers*max_tasks if max_tasks and not _per_child else len(items)
+    while todo:
+        batch, todo, again = todo[:size], todo[size:], []
+        ex, state = _pool(n_workers, max_tasks, max_rss, interval, initializer, initargs)
+        try:
+            with ex:
+                futs = {ex.submit(_run, f, i, items[i], kwargs):i for i in batch}
+                done = wait(futs).done
+            over = {int(p.stem) for p in state.glob('*.over')}
+            for fut in done:
+                i = futs[fut]
+                try: res[i] = fut.result()
+                except BrokenProcessPool as e:
+                    # tasks that didn't start, or that were lost because another one used too much memory, aren't to blame
+                    if not (state/f'{i}.started').exists() or (over and i not in over): again.append(i); continue
+                    lost[i] += 1
+                    if lost[i] <= retries:
+                        print(f'restarting: {items[i]}' + (f' used more than {max_rss} MB' if i in over else ''))
+                        again.append(i)
+                        continue
+                    if i in over: e = MemoryError(f'{items[i]} used more than {max_rss} MB')
+                    if on_fail is None: raise e
+                    res[i] = on_fail(items[i], e)
+            if not any(state.glob('*.started')): raise BrokenProcessPool('The workers died before running any task, for example in `initializer`')
+        finally: shutil.rmtree(state, ignore_errors=True)
+        todo = sorted(again) + todo # in the order of `items`, which are often the longest first
+    return L(res[i] for i in range(len(items)))
\ No newline at end of file